@@ -1,54 +1,115 @@
+import contextlib
 import os
+import time
+from collections import namedtuple
 import speech_recognition as sr
-import pyttsx3
-
-def main():
-    r = sr.Recognizer()
-    engine = pyttsx3.init()
-
-    # Adjusting for ambient noise
-    with sr.Microphone() as source:
-        print("Adjusting for ambient noise. Please wait...")
-        r.adjust_for_ambient_noise(source)  # Adjusting for 5 seconds
-        
-    # Listening for input
-    with sr.Microphone() as source:
-        print("Please say something")
-        engine.say("Please say something")
-        engine.runAndWait()
-        audio = r.listen(source)
-
-    # Attempting to recognize speech
+import metrics
+from feedback import Feedback
+from metrics import log
+from recognizers import FileRecognizer, get_recognizer, transcribe
+
+# Specifying the directory where you want to save the file
+VOICE_INPUT_FILE = os.path.join("/home/nappu", "voice_input.txt")
+CALIBRATION = 1.0 # s of ambient noise, once at start
+LISTEN_TIMEOUT = 5 # s of silence before listening starts over
+PHRASE_LIMIT = 30 # s, longest utterance
+Dictated = namedtuple("Dictated", "text audio_seconds recognition speech_to_text")
+
+
+class VoiceService:
+    # Dictation that stays up between utterances. The microphone is opened
+    # and calibrated once, after that the energy threshold follows the room
+    # (dynamic_energy_threshold); the recognizer model and the TTS worker stay
+    # loaded. Spoken feedback is queued (feedback.py), listening and
+    # recognition never wait for it; audio recorded while feedback was being
+    # spoken is thrown away instead, it would be the device's own voice.
+    # speech_to_text is the time from the end of speech to the text being
+    # available, it goes into the job as a span of the same name.
+    def __init__(self, recognizer=None, feedback=None):
+        # recognizer: see recognizers.py, picked with ECOBRAILLE_RECOGNIZER by default
+        self.recognizer = recognizer or get_recognizer()
+        self.feedback = feedback or Feedback()
+        self.stopped = False
+        if isinstance(self.recognizer, FileRecognizer):
+            # Recorded utterances instead of the microphone
+            self.listener = self.recognizer
+            self.microphone = contextlib.nullcontext
+        else:
+            self.listener = sr.Recognizer()
+            self.listener.dynamic_energy_threshold = True
+            self.microphone = sr.Microphone
+
+    def say(self, text, key=None, interrupt=False):
+        # Queues spoken feedback, see feedback.py for key and interrupt
+        self.feedback.say(text, key, interrupt)
+
+    def stop(self):
+        # Ends utterances() after the current one
+        self.stopped = True
+
+    def close(self):
+        # Lets queued feedback finish and stops the TTS worker
+        self.feedback.close()
+
+    def utterances(self):
+        # Yields a Dictated for every utterance understood, until stop() or
+        # the end of the input
+        with self.microphone() as source:
+            log.info("Adjusting for ambient noise. Please wait...")
+            with metrics.span("calibration"):
+                self.listener.adjust_for_ambient_noise(source, duration=CALIBRATION)
+            log.info("Please say something")
+            self.say("Please say something")
+            while not self.stopped:
+                listen_start = time.perf_counter()
+                try:
+                    with metrics.span("listening"):
+                        audio = self.listener.listen(source, timeout=LISTEN_TIMEOUT, phrase_time_limit=PHRASE_LIMIT)
+                except sr.WaitTimeoutError:
+                    continue
+                except EOFError:
+                    break
+                if self.feedback.spoke_since(listen_start):
+                    log.debug("Dropped audio recorded while feedback was spoken")
+                    metrics.count("dropped_utterances")
+                    continue
+                # listen returns pause_threshold after the speech ended
+                speech_end = time.perf_counter() - getattr(self.listener, "pause_threshold", 0.0)
+                try:
+                    utterance = transcribe(self.recognizer, audio)
+                except sr.UnknownValueError:
+                    log.warning("Speech recognition could not understand audio")
+                    self.say("Sorry, I could not understand what you said.", interrupt=True)
+                    continue
+                except sr.RequestError as e:
+                    log.error("Speech recognition failed; %s", e)
+                    self.say("Sorry, I could not process your request.", interrupt=True)
+                    continue
+                speech_to_text = time.perf_counter() - speech_end
+                metrics.job().add_time("speech_to_text", speech_to_text)
+                metrics.count("recognized_chars", len(utterance.text))
+                log.info("You have said:\n %s", utterance.text)
+                log.debug("Text ready %.3f s after the end of speech, energy threshold %.0f", speech_to_text,
+                          getattr(self.listener, "energy_threshold", 0))
+                yield Dictated(utterance.text, utterance.audio_seconds, utterance.latency, speech_to_text)
+
+
+def main(recognizer=None):
+    # Runs until interrupted, every utterance replaces the voice input file
+    service = VoiceService(recognizer)
     try:
-        print("Recognizing Now .... ")
-        engine.say("Recognizing Now .... ")
-        engine.runAndWait()
-        
-        recognized_text = r.recognize_google(audio)
-        print("You have said:\n", recognized_text)
-        engine.say("You have said:\n" + recognized_text)
-        engine.runAndWait()
-        
-        # Specifying the directory where you want to save the file
-        directory = "/home/nappu"
-        filename = "voice_input.txt"
-        filepath = os.path.join(directory, filename)
-        
-        # Writing recognized text to file
-        with open(filepath, "w") as text_file:
-            text_file.write(recognized_text)
-        print("Recognized text saved to:", filepath)
-        # engine.say("Recognized text saved to " + filepath)
-        # engine.runAndWait()
-
-    except sr.UnknownValueError:
-        print("Google Speech Recognition could not understand audio")
-        engine.say("Sorry, I could not understand what you said.")
-        engine.runAndWait()
-    except sr.RequestError as e:
-        print("Could not request results from Google Speech Recognition service; {0}".format(e))
-        engine.say("Sorry, I could not process your request.")
-        engine.runAndWait()
+        for dictated in service.utterances():
+            service.say("You have said:\n" + dictated.text)
+            # Writing recognized text to file
+            with metrics.span("file_io"), open(VOICE_INPUT_FILE, "w") as text_file:
+                text_file.write(dictated.text)
+            log.info("Recognized text saved to: %s", VOICE_INPUT_FILE)
+    except KeyboardInterrupt:
+        log.info("Dictation stopped")
+    finally:
+        service.close()
+    metrics.dump_job()
 
 if __name__ == "__main__":
+    metrics.configure_logging()
     main()
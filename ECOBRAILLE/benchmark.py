@@ -0,0 +1,388 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from dotstore import DotStore
+from newgcodey import BrailleGCodeGenerator
+from pathplanner import MODES
+
+# Benchmarks for every stage from text to simulated embossing: generation on
+# growing corpora, layout, dot storage, path planning, step schedules, G-code
+# parsing, the job format, simulated execution and parallel pages.
+#
+# Usage: python benchmark.py [size ...] [--save [--timings]] [--check] [--baseline FILE]
+#   e.g. python benchmark.py 1K 100K 10M
+# Every section records named results. With a baseline file present they are
+# compared against it: results that do not depend on the machine (travel,
+# simulated seconds) must not get worse at all, dot counts must not change.
+# Sections that know the right answer check it as well. Wall-clock results
+# are only compared, within --tolerance, against a baseline saved on the same
+# machine; otherwise they are just listed. --save stores this run as the new
+# baseline, the deterministic results only unless --timings is given (the
+# committed baseline has none), --check exits non-zero on a regression.
+
+DEFAULT_SIZES = ["1K", "100K", "10M"]
+WORDS = ["the", "braille", "embosser", "prints", "dots", "on", "paper", "voice",
+         "text", "page", "line", "cell", "and", "of", "a", "to", "is", "42", "7"]
+# Sample size for the single page sections
+CHUNK_CHARS = 256
+# Larger inputs are only streamed, a buffered 10M program does not fit a Pi
+MAX_BUFFERED_CHARS = 1024 * 1024
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_TOLERANCE = 0.25
+
+# name -> {"value", "better": "higher" | "lower" | "exact", "noisy": wall-clock or not}
+results = {}
+# Failed correctness checks, reported and failed by --check like regressions
+failures = []
+
+
+def record(name, value, better="lower", noisy=True):
+    results[name] = {"value": value, "better": better, "noisy": noisy}
+
+
+def best_of(repeat, run):
+    # Fastest of several runs, short timings are too noisy from a single one.
+    # Returns (what run returned, seconds).
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return value, best
+
+
+def machine():
+    return " ".join(part for part in (platform.machine(), platform.processor(), f"{os.cpu_count()} CPUs") if part)
+
+
+def parse_size(size):
+    units = {"K": 1024, "M": 1024 * 1024}
+    if size[-1].upper() in units:
+        return int(float(size[:-1]) * units[size[-1].upper()])
+    return int(size)
+
+
+def make_corpus(n_chars, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < n_chars:
+        word = rng.choice(WORDS)
+        if rng.random() < 0.1:
+            word += "."
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)[:n_chars]
+
+
+def bench_generation(text, sink=None):
+    generator = BrailleGCodeGenerator()
+    repeat = 1 if len(text) > MAX_BUFFERED_CHARS else 3
+    _, elapsed = best_of(repeat, lambda: generator.braille_to_gcode(text, sink))
+    return generator.path_planner.dots, elapsed
+
+
+def bench_zigzag(text):
+    # gcode_sort_zigzag on the dots of the first line of cells
+    generator = BrailleGCodeGenerator()
+    page, positions = next(generator.iter_dot_lines([text]))
+    ordered, elapsed = best_of(200, lambda: generator.gcode_sort_zigzag(positions))
+    print(f"{len(ordered)} dots, {1e6 * elapsed / len(ordered):.2f} us/dot")
+    record("zigzag.us_per_dot", 1e6 * elapsed / len(ordered))
+
+
+def bench_path_planning(text):
+    generator = BrailleGCodeGenerator()
+    for mode in MODES:
+        generator.BRAILLE["pathPlanning"] = mode
+        _, elapsed = best_of(5, lambda: generator.braille_to_gcode(text[:CHUNK_CHARS]))
+        print(f"{mode:>8} {elapsed:>9.3f}s  {generator.path_planner.report()}")
+        record(f"path_planning.{mode}.seconds", elapsed)
+        record(f"path_planning.{mode}.travel_mm", generator.path_planner.travel_after / 100, noisy=False)
+
+
+def bench_layout(char_counts=(50, 100, 200, 400)):
+    # Every cell must be placed once: dots should match the glyph table and
+    # time should grow linearly with the number of characters. Digits are
+    # left out because the number prefix replaces the first digit's cell.
+    generator = BrailleGCodeGenerator()
+    glyphs, number_prefix = generator.get_glyphs()
+    print(f"{'chars':>8} {'expected':>9} {'dots':>9} {'seconds':>9} {'us/char':>9}")
+    for n_chars in char_counts:
+        text = "".join(char for char in make_corpus(n_chars) if not char.isdigit())
+        expected = sum(len(glyphs[char]) for char in text)
+        _, elapsed = best_of(5, lambda: generator.braille_to_gcode(text))
+        dots = generator.path_planner.dots
+        print(f"{n_chars:>8} {expected:>9} {dots:>9} {elapsed:>9.4f} {1e6 * elapsed / n_chars:>9.1f}")
+        record(f"layout.{n_chars}.us_per_char", 1e6 * elapsed / n_chars)
+        record(f"layout.{n_chars}.dots", dots, "exact", noisy=False)
+        if dots != expected:
+            failures.append(f"layout.{n_chars}.dots: {dots}, expected {expected}")
+
+
+def bench_dot_storage(n_dots=100000):
+    # Bytes per dot held by a one-dict-per-dot list against a DotStore
+    rng = random.Random(0)
+    points = [(rng.uniform(0, 180), rng.uniform(0, 260)) for _ in range(n_dots)]
+    for name in ("list of dicts", "DotStore"):
+        tracemalloc.start()
+        if name == "DotStore":
+            dots = DotStore()
+            for x, y in points:
+                dots.append(x, y)
+        else:
+            dots = [{"x": x, "y": y} for x, y in points]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:>14} {n_dots:>8} dots {size / n_dots:>8.1f} bytes/dot")
+        if name == "DotStore":
+            record("dot_storage.bytes_per_dot", size / n_dots, noisy=False)
+        del dots
+
+
+def bench_parallel_pages(text, worker_counts=(1, 2, 4)):
+    generator = BrailleGCodeGenerator()
+    pages = generator.paginate(text)
+    print(f"{len(pages)} pages, {os.cpu_count()} CPUs")
+    baseline = None
+    for workers in worker_counts:
+        _, elapsed = best_of(3, lambda: generator.generate_pages_parallel(text, workers, pages=pages))
+        baseline = baseline or elapsed
+        print(f"{workers:>8} workers {elapsed:>9.3f}s  speedup {baseline / elapsed:>5.2f}x")
+        record(f"parallel_pages.{workers}_workers.seconds", elapsed)
+
+
+def bench_execution(text):
+    # Runs the executor against the simulated GPIO backend: wall time is the
+    # Python overhead, simulated time is what the job takes on the machine
+    import newbrailecombine1 as executor
+
+    generator = executor.BrailleGCodeGenerator()
+    gcode = generator.braille_to_gcode(text)
+    def run():
+        gpio = executor.SetupPins(executor.SimulatedBackend(record_edges=False))
+        executor.motion.set_position(0, 0)
+        executor.EnableMotors()
+        executor.ProcessGcodeString(gcode)
+        return gpio
+
+    gpio, elapsed = best_of(3, run)
+    commands = gcode.count("\n")
+    print(f"{generator.path_planner.dots} dots, wall {elapsed:.3f} s, {commands / elapsed:.0f} lines/s, {gpio.report()}")
+    record("execution.lines_per_s", commands / elapsed, "higher")
+    record("execution.simulated_s", gpio.clock, noisy=False)
+    return gpio
+
+
+def bench_heads(text, heads=("single", "column", "cell")):
+    # Simulated page time for each embossing head, see glyphcache.HEADS
+    import newbrailecombine1 as executor
+
+    print(f"{'head':>8} {'strikes':>8} {'dots':>8} {'simulated s':>12} {'speedup':>8}")
+    baseline = None
+    for head in heads:
+        generator = executor.BrailleGCodeGenerator()
+        generator.BRAILLE["head"] = head
+        gcode = generator.braille_to_gcode(text)
+        gpio = executor.SetupPins(executor.SimulatedBackend(record_edges=False), head)
+        executor.motion.set_position(0, 0)
+        executor.EnableMotors()
+        executor.ProcessGcodeString(gcode)
+        baseline = baseline or gpio.clock
+        print(f"{head:>8} {generator.path_planner.dots:>8} {gpio.strikes:>8} {gpio.clock:>12.1f} "
+              f"{baseline / gpio.clock:>7.2f}x")
+        record(f"heads.{head}.simulated_s", gpio.clock, noisy=False)
+
+
+def bench_step_schedule(length_mm=100):
+    # Precomputing a move: compile cost, schedule size and the step rate the
+    # schedule asks the playback backend for
+    from motionplanner import MotionPlanner
+    from stepschedule import compile_move
+
+    planner = MotionPlanner(100)
+    planner.set_feed(60 * planner.max_speed)
+    planner.add(length_mm, length_mm / 3)
+    move = planner.flush()[0]
+    schedule, elapsed = best_of(5, lambda: compile_move(move, 21, 23, 20, 22))
+    peak_rate = 1e9 / min(schedule.delays)
+    print(f"{len(schedule)} pulses, compile {1e6 * elapsed / len(schedule):.2f} us/pulse, "
+          f"{schedule.nbytes() / len(schedule):.0f} bytes/pulse, peak {peak_rate / 1000:.1f} kHz, "
+          f"move {schedule.duration_ns() / 1e9:.3f} s")
+    record("step_schedule.us_per_pulse", 1e6 * elapsed / len(schedule))
+    record("step_schedule.move_s", schedule.duration_ns() / 1e9, noisy=False)
+
+
+def bench_gcode_parser(text):
+    # Parse throughput of gcodeparser, streamed from a file like the executor
+    import tempfile
+    from gcodeparser import parse_stream
+
+    with tempfile.TemporaryFile("w+", newline="") as file:
+        BrailleGCodeGenerator().braille_to_gcode(text, file)
+        size = file.tell()
+        def run():
+            file.seek(0)
+            return sum(1 for command in parse_stream(file))
+        commands, elapsed = best_of(3, run)
+    print(f"{commands} commands, {size} bytes, {elapsed:.3f} s, {commands / elapsed:.0f} lines/s, "
+          f"{size / elapsed / 1e6:.1f} MB/s")
+    record("gcode_parser.lines_per_s", commands / elapsed, "higher")
+
+
+def bench_job_format(text):
+    # Text G-code against the compiled job: size and the cost of getting the
+    # commands back out of each
+    from jobformat import Job, gcode_to_records
+
+    generator = BrailleGCodeGenerator()
+    gcode = generator.braille_to_gcode(text)
+    job = generator.braille_to_job(text)
+    parsed, text_elapsed = best_of(3, lambda: sum(1 for record in gcode_to_records(gcode, 100)))
+    records, job_elapsed = best_of(3, lambda: sum(1 for record in Job(job)))
+    print(f"G-code {len(gcode.encode()):>9} bytes, parse {1e6 * text_elapsed / parsed:.2f} us/command")
+    print(f"job    {len(job):>9} bytes, read  {1e6 * job_elapsed / records:.2f} us/command")
+    record("job_format.parse_us_per_command", 1e6 * text_elapsed / parsed)
+    record("job_format.read_us_per_command", 1e6 * job_elapsed / records)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, timings=False):
+    data = {
+        "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": machine(),
+        "python": platform.python_version(),
+        "results": {name: result for name, result in results.items() if timings or not result["noisy"]},
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+    print(f"Baseline saved to {path}")
+
+
+def compare(baseline, tolerance=DEFAULT_TOLERANCE):
+    # Prints every result next to its baseline, returns the regressed names.
+    # Wall-clock results only count on the machine the baseline comes from.
+    same_machine = baseline["machine"] == machine()
+    print(f"Against baseline of {baseline['saved']} ({baseline['machine']}, Python {baseline['python']})")
+    if not same_machine:
+        print(f"Wall-clock results are not compared, this is {machine()}")
+    print(f"{'result':<40} {'baseline':>12} {'now':>12} {'change':>8}")
+    regressions = []
+    for name, result in sorted(results.items()):
+        old = baseline["results"].get(name)
+        if result["noisy"] and not same_machine:
+            print(f"{name:<40} {'-':>12} {result['value']:>12.4g}")
+            continue
+        if old is None:
+            print(f"{name:<40} {'-':>12} {result['value']:>12.4g}      new")
+            continue
+        before, now = old["value"], result["value"]
+        change = (now - before) / before if before else 0.0
+        if result["better"] == "exact":
+            # Counts that are either right or wrong, any change is a regression
+            worse = float(now != before)
+        else:
+            worse = -change if result["better"] == "higher" else change
+        allowed = tolerance if result["noisy"] else 1e-9
+        status = ""
+        if worse > allowed:
+            status = "CHANGED" if result["better"] == "exact" else "REGRESSED"
+            regressions.append(name)
+        elif worse < -allowed:
+            status = "improved"
+        print(f"{name:<40} {before:>12.4g} {now:>12.4g} {100 * change:>+7.1f}% {status}")
+    return regressions
+
+
+def main(sizes, baseline_path=BASELINE_FILE, save=False, check=False, tolerance=DEFAULT_TOLERANCE, timings=False):
+    print(f"{'input':>8} {'mode':>7} {'dots':>10} {'seconds':>9} {'dots/s':>12}")
+    with open(os.devnull, "w") as devnull:
+        for size in sizes:
+            text = make_corpus(parse_size(size))
+            for mode, sink in (("buffer", None), ("stream", devnull)):
+                if sink is None and len(text) > MAX_BUFFERED_CHARS:
+                    continue
+                dots, elapsed = bench_generation(text, sink)
+                rate = dots / elapsed if elapsed > 0 else 0
+                print(f"{size:>8} {mode:>7} {dots:>10} {elapsed:>9.3f} {rate:>12.0f}")
+                record(f"generation.{size}.{mode}.dots_per_s", rate, "higher")
+                record(f"generation.{size}.dots", dots, "exact", noisy=False)
+
+    print()
+    print("Zigzag sort, one line")
+    bench_zigzag(make_corpus(CHUNK_CHARS))
+
+    print()
+    print("Cell layout, one page")
+    bench_layout()
+
+    print()
+    print("Dot storage")
+    bench_dot_storage()
+
+    print()
+    print("Path planning, one page")
+    bench_path_planning(make_corpus(CHUNK_CHARS))
+
+    print()
+    print("Step schedule, one 100 mm move")
+    bench_step_schedule()
+
+    print()
+    print("G-code parser, 100K")
+    bench_gcode_parser(make_corpus(parse_size("100K")))
+
+    print()
+    print("Job format, 100K")
+    bench_job_format(make_corpus(parse_size("100K")))
+
+    print()
+    print("Simulated execution, one page")
+    bench_execution(make_corpus(CHUNK_CHARS))
+
+    print()
+    print("Embossing heads, one page")
+    bench_heads(make_corpus(CHUNK_CHARS))
+
+    print()
+    print("Parallel page generation, 100K")
+    bench_parallel_pages(make_corpus(parse_size("100K")))
+
+    print()
+    baseline = load_baseline(baseline_path)
+    regressions = compare(baseline, tolerance) if baseline else []
+    if baseline is None:
+        print(f"No baseline at {baseline_path}, run with --save to store one")
+    elif regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+    for failure in failures:
+        print(f"FAILED {failure}")
+    if save:
+        save_baseline(baseline_path, timings)
+    return 1 if check and (regressions or failures) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ECO Braille benchmarks")
+    parser.add_argument("sizes", nargs="*", default=DEFAULT_SIZES, help="corpus sizes, e.g. 1K 100K 10M")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file to compare against")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--timings", action="store_true", help="with --save, store wall-clock results too")
+    parser.add_argument("--check", action="store_true", help="exit with 1 if anything regressed")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed change of wall-clock results (0.25 = 25%%)")
+    args = parser.parse_args()
+    sys.exit(main(args.sizes, args.baseline, args.save, args.check, args.tolerance, args.timings))
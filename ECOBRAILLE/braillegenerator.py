@@ -0,0 +1,429 @@
+import itertools
+from array import array
+import os
+from gcodeemitter import GcodeEmitter
+from jobformat import braille_to_job
+from jobestimate import estimate_job
+from celllayout import CellLayout
+from glyphcache import compile_glyph, compile_glyphs, glyph_config_key
+from dotstore import DotStore
+import metrics
+from metrics import count_dots, log
+from paginator import generate_pages_parallel, page_gcode, paginate, paginated_gcode_iter
+from pathplanner import PathPlanner, boustrophedon
+
+# Text to braille to G-code, shared by the generators in newgcodey.py and
+# newbrailecombine1.py. They differ only in where the dots end up:
+#   cell_origin(x, y)   paper position of a cell to the coordinates its dots
+#                       are offset from, paper coordinates here
+#   glyph_spacing()     dot pitch and axis signs the glyphs are compiled with
+#   GCODE_FILE          name save_gcode_to_file writes
+
+
+class GcodeSerializer:
+    # G-code text for BrailleGenerator.iter_program
+    def __init__(self, generator):
+        self.generator = generator
+
+    def program_start(self):
+        return [self.generator.gcode_program_start()]
+
+    def page_change(self, page):
+        return [self.generator.gcode_page_change(page)]
+
+    def dots(self, positions):
+        return list(self.generator.gcode_strikes(positions))
+
+    def program_end(self):
+        return [self.generator.gcode_program_end()]
+
+
+class BrailleGenerator:
+    GCODE_FILE = "newcode.txt"
+
+    def __init__(self):
+        # Define braille dimensions
+        self.BRAILLE = {
+            "marginWidth": 3,
+            "marginHeight": 5,
+            "paperWidth": 180,
+            "paperHeight": 260,
+            "letterWidth": 2.5,
+            "dotRadius": 1.2,
+            "letterPadding": 3.7,
+            "linePadding": 3,
+            "headDownPosition": -2.0,
+            "headUpPosition": 10,
+            "speed": 5000,
+            "delta": False,
+            "goToZero": True,
+            "invertX": True,
+            "invertY": True,
+            "mirrorX": False,
+            "mirrorY": True,
+            "language": "6 dots",
+            "GCODEup": 'M3 S1',
+            "GCODEdown": 'M3 S0',
+            # Whole dot in one command (down, hold, up), timed by the executor's
+            # solenoid model. Empty sends GCODEdown and GCODEup instead.
+            "GCODEstrike": 'M3 S2',
+            # Embossing head: "single" pin, "column" (a pin per row) or "cell"
+            # (a pin per dot). Multi-pin heads get one GCODEstrike per column
+            # or cell with P<mask> of the pins to fire, see glyphcache.py
+            "head": "single",
+            "usedotgrid": False,
+            # Dot ordering: "zigzag", "nearest" or "2opt", see pathplanner.py
+            "pathPlanning": "zigzag",
+            # Sent between pages together with a move to 0, 0
+            "GCODEpageChange": 'M0'
+        }
+
+        # Define dot map for different languages
+        self.LANGUAGES = {
+            "6 dots": 
+                {
+                "latinToBraille": {
+                    "a": [1],
+		            "b": [1,2],
+		            "c": [1,4],
+		            "d": [1,4,5],
+		            "e": [1,5],
+		            "f": [1,2,4],
+		            "g": [1,2,4,5],
+		            "h": [1,2,5],
+		            "i": [2,4],
+		            "j": [2,4,5],
+		            "k": [1,3],
+		            "l": [1,2,3],
+		            "m": [1,3,4],
+		            "n": [1,3,4,5],
+		            "o": [1,3,5],
+		            "p": [1,2,3,4],
+		            "q": [1,2,3,4,5],
+		            "r": [1,2,3,5],
+		            "s": [2,3,4],
+		            "t": [2,3,4,5],
+		            "u": [1,3,6],
+		            "v": [1,2,3,6],
+		            "w": [2,4,5,6],
+		            "x": [1,3,4,6],
+		            "y": [1,3,4,5,6],
+		            "z": [1,3,5,6],
+		            " ": [],
+		            ".": [2,5,6],
+		            ",": [2],
+		            "?": [2,6],
+		            ";": [2,3],
+		            ":": [2,4],
+		            "!": [2,3,5],
+		            "(": [2,3,6],
+		            ")": [3,5,6],
+		            "'": [3],
+		            "-": [3,6],
+		            "/": [3,4],
+		            "*": [3,5],
+		            "+": [2,3,5],
+		            "=": [2,3,5,6],
+		            "0": [3, 4, 5, 6],
+		            "1": [1, 6],
+		            "2": [1, 2, 6],
+		            "3": [1, 4, 6],
+		            "4": [1, 4, 5, 6],
+		            "5": [1, 5, 6],
+		            "6": [1, 2, 4, 6],
+		            "7": [1, 2, 4, 5, 6],
+		            "8": [1, 2, 5, 6],
+		            "9": [2, 4, 6]
+                },
+                "dotMap": [[1, 2, 3], [4, 5, 6]],
+                "numberPrefix": [3, 4, 5, 6]
+            }
+        }
+
+        self.GCODEsvgdotposition = []
+        self.xhead = 0
+        self.yhead = 0
+        self.page_change_hook = None
+        self.path_planner = PathPlanner(self.BRAILLE["pathPlanning"])
+        self.glyph_table = None
+        self.glyph_key = None
+        self.generated_gcode = "" 
+
+    def replace_at(self, s, n, t):
+        return s[:n] + t + s[n+1:]
+
+    def dot_position(self, x, y):
+        return {"x": x, "y": y}
+
+    def gcode_set_absolute_positioning(self):
+        return "G90;\r\n"
+
+    def gcode_motor_off(self):
+        return "M84;\r\n"
+
+    def gcode_home(self):
+        return "G28 X;\r\n" + "G28 Y;\r\n"
+
+    def gcode_reset_position(self, X, Y):
+        return f"G92 X{X:.2f} Y{Y:.2f};\r\n"
+
+    def gcode_set_speed(self, speed):
+        return f"G1 F{speed};\r\n"
+
+    def gcode_position(self, X, Y):
+        code = ""
+        has_values = False
+        if X is not None:
+            code += f" X{X:.2f}"
+            has_values = True
+        if Y is not None:
+            code += f" Y{Y:.2f}"
+            has_values = True
+        if has_values:
+            code += ";\r\n"
+        return code
+
+    def gcode_go_to(self, X, Y):
+        return "G0" + self.gcode_position(X, Y)
+
+    def gcode_move_to(self, X, Y, Z=None):
+        code = "G1"
+        code += self.gcode_position(X, Y)
+        if Z is not None:
+            code += f" Z{Z:.2f}"
+        code += "\r"
+        return code
+
+    def gcode_move_to_cached(self, X=None, Y=None, comment=None):
+        if X is not None:
+            self.xhead = X
+        if Y is not None:
+            self.yhead = Y
+        if comment is not None:
+            code = f"G1 X{self.xhead:.2f} Y{self.yhead:.2f}; {comment}\r\n"
+        else:
+            code = f"G1 X{self.xhead:.2f} Y{self.yhead:.2f}\r\n"
+        return code
+
+    
+    def gcode_print_dot(self):
+        if self.BRAILLE["GCODEstrike"]:
+            return f"{self.BRAILLE['GCODEstrike']};\r\n"
+        return f"{self.BRAILLE['GCODEdown']};\r\n{self.BRAILLE['GCODEup']};\r\n"
+
+    def gcode_sort_zigzag(self, positions):
+        return positions.take(boustrophedon(positions))
+
+    def gcode_program_start(self):
+        code = self.gcode_home()
+        code += self.gcode_set_speed(self.BRAILLE["speed"])
+        if self.BRAILLE["goToZero"]:
+            code += self.gcode_move_to(0, 0)
+        return code
+
+    def gcode_program_end(self):
+        return self.gcode_move_to(0, 0) + self.gcode_motor_off()
+
+    def gcode_page_change(self, page):
+        # Sent between pages: park the head and pause (M0) until the next
+        # sheet is in. page_change_hook(page) can supply its own sequence.
+        if self.page_change_hook is not None:
+            return self.page_change_hook(page)
+        return self.gcode_go_to(0, 0) + self.BRAILLE["GCODEpageChange"] + ";\r\n"
+
+    def gcode_print_pins(self, mask):
+        return f"{self.BRAILLE['GCODEstrike']} P{mask};\r\n"
+
+    def gcode_dot_move(self, X, Y):
+        return f"G1 X{X:.2f} Y{Y:.2f}\r\n"
+
+    def gcode_dots(self, positions, planner=None):
+        # Pages may be generated on several threads at once, so nothing here
+        # touches shared state apart from the planner handed in
+        if planner is None:
+            planner = self.path_planner
+        return self.gcode_strikes(planner.plan(positions))
+
+    def gcode_strikes(self, positions):
+        # G-code for dots (or multi-pin strikes) already in planned order
+        if positions.masks is not None:
+            for x, y, mask in positions.strikes():
+                yield self.gcode_dot_move(x, y)
+                yield self.gcode_print_pins(mask)
+            return
+        for x, y in positions:
+            yield self.gcode_dot_move(x, y)
+            yield self.gcode_print_dot()
+
+    def braille_to_gcode(self, text, sink=None):
+        out = GcodeEmitter(sink)
+        out.writelines(self.braille_to_gcode_iter(text))
+        return out.getvalue()
+
+    def braille_to_gcode_iter(self, chunks):
+        # Text goes in as a string or any iterable of text chunks and G-code
+        # comes out lazily, see iter_program
+        return self.iter_program(chunks, GcodeSerializer(self))
+
+    def iter_program(self, chunks, serializer, job=None, planner=None):
+        # The translation loop behind braille_to_gcode_iter and the job format
+        # (jobformat.RecordSerializer): lays out the text, plans the dots of
+        # each line of cells and yields what serializer makes of them. Dots
+        # are only buffered for the line being laid out, so the embosser can
+        # start while later text is translated. Every page after the first,
+        # blank ones included, starts with serializer.page_change. Counters
+        # and spans go to job (default metrics.job()); planner replaces a
+        # fresh self.path_planner.
+        if isinstance(chunks, str):
+            chunks = [chunks]
+        if planner is None:
+            planner = self.path_planner = PathPlanner(self.BRAILLE["pathPlanning"])
+        if job is None:
+            job = metrics.job()
+        yield from serializer.program_start()
+        current_page = 0
+        lines = self.iter_dot_lines(chunks)
+        while True:
+            # Each stage is timed separately for the job metrics, a line is
+            # serialized before it is handed on so the consumer's time is not
+            # counted as serialization
+            with job.span("translation"):
+                line = next(lines, None)
+            if line is None:
+                break
+            page, positions = line
+            if page != current_page:
+                # Blank pages in between still get their own sheet
+                for blank in range(current_page + 1, page + 1):
+                    yield from serializer.page_change(blank)
+                planner.set_head(0, 0)
+                current_page = page
+            with job.span("path_planning"):
+                positions = planner.plan(positions)
+            with job.span("serialization"):
+                code = serializer.dots(positions)
+            count_dots(job, positions)
+            yield from code
+        job.count("pages", current_page + 1)
+        yield from serializer.program_end()
+
+    def braille_to_job(self, text, sink=None, job=None):
+        # Same program as braille_to_gcode compiled to the binary job format
+        # (jobformat.py); returns the bytes when no sink is given. job: the
+        # JobMetrics to count into, metrics.job() by default.
+        return braille_to_job(self, text, sink, job=job)
+
+    def estimate(self, text, motion=None, solenoid=None):
+        # Dots, travel and time per page of braille_to_gcode(text) without
+        # running it, see jobestimate.py. Pass a planner and solenoid model set
+        # up like the executor's to match its settings, the defaults are the
+        # executor's defaults.
+        return estimate_job(self, text, motion, solenoid)
+
+    def paginate(self, text):
+        # Page list with per-page dot counts, see paginator.py
+        return paginate(self, text)
+
+    def page_gcode(self, text, page, sink=None):
+        return page_gcode(self, text, page, sink)
+
+    def paginated_gcode_iter(self, text, pages=None, lookahead=1):
+        return paginated_gcode_iter(self, text, pages, lookahead)
+
+    def generate_pages_parallel(self, text, workers=None, sink=None, pages=None):
+        # Pages translated and planned in a process pool, reassembled in order
+        return generate_pages_parallel(self, text, workers, sink, pages)
+
+    def iter_dot_lines(self, chunks, is_writing_number=False, is_special_char=False, page_starts=None):
+        # Lays out the text and yields (page, dots) for each finished line of
+        # cells. Number / special character mode can be carried in from an
+        # earlier page; page_starts, if given, collects (text offset,
+        # is_writing_number, is_special_char) for every page after the first.
+        is_8dot = "8 dots" in self.BRAILLE["language"]
+        layout = CellLayout(self.BRAILLE, 4 if is_8dot else 3)
+        glyphs, number_prefix = self.get_glyphs()
+
+        single_pin = self.BRAILLE["head"] == "single"
+        dots = DotStore() if single_pin else DotStore(masks=array('I'))
+        page = layout.page
+        line = layout.line
+
+        for offset, char in enumerate(itertools.chain.from_iterable(chunks)):
+            char_is_capital_letter = is_8dot and char.isupper()
+            char_is_line_break = char in ["\r", "\n"]
+
+            if char_is_line_break:
+                layout.new_line()
+            else:
+                glyph = glyphs.get(char)
+                if glyph is None:
+                    log.warning("Character '%s' was not translated in braille.", char)
+                    continue
+
+                if not is_writing_number and char.isdigit():
+                    glyph = number_prefix
+                    is_writing_number = True
+                elif is_writing_number and char == " ":
+                    is_writing_number = False
+                elif char_is_capital_letter:
+                    glyph = number_prefix
+                elif not is_special_char and self.get_prefix_for_special_character(char):
+                    glyph = self.compile_indices(self.get_prefix_for_special_character(char))
+                    is_special_char = True
+
+                if glyph:
+                    char_x, char_y = self.cell_origin(*layout.position())
+                    if single_pin:
+                        for dx, dy in glyph:
+                            dots.append(char_x + dx, char_y + dy)
+                    else:
+                        for dx, dy, mask in glyph:
+                            dots.append_strike(char_x + dx, char_y + dy, mask)
+                layout.next_cell()
+
+            if layout.line != line or layout.page != page:
+                # Moved on to a new line of cells, hand over the finished one
+                if dots:
+                    yield page, dots
+                dots = DotStore() if single_pin else DotStore(masks=array('I'))
+                if layout.page != page and page_starts is not None:
+                    page_starts.append((offset + 1, is_writing_number, is_special_char))
+                page = layout.page
+                line = layout.line
+
+        if dots:
+            yield page, dots
+
+    def cell_origin(self, x, y):
+        return x, y
+
+    def glyph_spacing(self):
+        # (across, down, sign x, sign y): paper coordinates, dotRadius * 2
+        # apart across and letterWidth down
+        return self.BRAILLE["dotRadius"] * 2, self.BRAILLE["letterWidth"], 1, 1
+
+    def get_glyphs(self):
+        # The compiled table is only rebuilt when the BRAILLE settings or the
+        # language it was compiled from have changed
+        key = glyph_config_key(self.BRAILLE, self.LANGUAGES)
+        if key != self.glyph_key:
+            spacing_x, spacing_y, sign_x, sign_y = self.glyph_spacing()
+            self.glyph_table = compile_glyphs(self.BRAILLE, self.LANGUAGES, spacing_x, spacing_y, (sign_x, sign_y))
+            self.glyph_key = key
+        return self.glyph_table
+
+    def compile_indices(self, indices):
+        language = self.LANGUAGES[self.BRAILLE["language"]]
+        return compile_glyph(indices, language["dotMap"], *self.glyph_spacing(), self.BRAILLE["head"])
+
+    def get_prefix_for_special_character(self, char):
+        # Implement logic to get prefix for special characters
+        return []
+    def save_gcode_to_memory(self, gcode):
+        self.generated_gcode = gcode
+        
+    def save_gcode_to_file(self, gcode, directory):
+        filename = os.path.join(directory, self.GCODE_FILE)
+        with metrics.span("file_io"), open(filename, "w") as file:
+            file.write(gcode)
+        log.info("File saved succesfully")
@@ -0,0 +1,37 @@
+# Places braille cells on a page / line / column grid. Every cell is placed
+# exactly once, so laying out n characters costs O(n) and each dot is
+# emitted a single time.
+EPSILON = 1e-9
+
+
+class CellLayout:
+    def __init__(self, braille, cell_rows=3):
+        self.cell_width = braille["letterWidth"] + braille["letterPadding"]
+        self.line_height = cell_rows * braille["letterWidth"] + braille["linePadding"]
+        self.left = braille["marginWidth"]
+        self.top = braille["marginHeight"]
+        # A cell fits while its right hand dots stay inside the margin
+        right = braille["paperWidth"] - braille["marginWidth"] - braille["letterWidth"] - braille["dotRadius"]
+        bottom = braille["paperHeight"] - braille["marginHeight"]
+        self.columns = max(1, int((right - self.left) / self.cell_width + EPSILON) + 1)
+        self.lines = max(1, int((bottom - self.top) / self.line_height + EPSILON) + 1)
+        self.page = 0
+        self.line = 0
+        self.column = 0
+
+    def position(self):
+        # Paper coordinates (mm) of the top left dot of the current cell
+        return (self.left + self.column * self.cell_width,
+                self.top + self.line * self.line_height)
+
+    def next_cell(self):
+        self.column += 1
+        if self.column >= self.columns:
+            self.new_line()
+
+    def new_line(self):
+        self.column = 0
+        self.line += 1
+        if self.line >= self.lines:
+            self.line = 0
+            self.page += 1
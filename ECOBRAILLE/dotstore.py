@@ -0,0 +1,112 @@
+from array import array
+
+# Dot positions kept as two parallel arrays of fixed-point integers in
+# hundredths of a millimetre, the resolution the G-code is written with.
+# That is 8 bytes per dot against a few hundred for a {"x": .., "y": ..} dict,
+# and rows/duplicates compare exactly instead of through float tolerances.
+# Stores for a multi-pin head also keep a pin mask per position (which pins
+# of the head fire there), see glyphcache.compile_glyph.
+SCALE = 100
+
+
+def to_fixed(mm):
+    return int(round(mm * SCALE))
+
+
+def to_mm(fixed):
+    return fixed / SCALE
+
+
+class DotStore:
+    def __init__(self, xs=None, ys=None, masks=None):
+        self.xs = array('i') if xs is None else xs
+        self.ys = array('i') if ys is None else ys
+        self.masks = masks
+
+    def append(self, x, y):
+        # x, y in mm
+        self.xs.append(int(round(x * SCALE)))
+        self.ys.append(int(round(y * SCALE)))
+
+    def append_strike(self, x, y, mask):
+        # x, y in mm of the head's first pin, mask of the pins to fire
+        self.xs.append(int(round(x * SCALE)))
+        self.ys.append(int(round(y * SCALE)))
+        self.masks.append(mask)
+
+    def append_fixed(self, x, y):
+        self.xs.append(x)
+        self.ys.append(y)
+
+    def extend(self, other):
+        self.xs.extend(other.xs)
+        self.ys.extend(other.ys)
+        if self.masks is not None:
+            self.masks.extend(other.masks)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __bool__(self):
+        return len(self.xs) > 0
+
+    def __getitem__(self, i):
+        # Fixed-point (x, y) of dot i
+        return self.xs[i], self.ys[i]
+
+    def __iter__(self):
+        # (x, y) in mm, in stored order
+        for x, y in zip(self.xs, self.ys):
+            yield x / SCALE, y / SCALE
+
+    def strikes(self):
+        # (x, y, mask) in mm, in stored order
+        for x, y, mask in zip(self.xs, self.ys, self.masks):
+            yield x / SCALE, y / SCALE, mask
+
+    def dot_count(self):
+        # Dots embossed, a strike of a multi-pin head counts each pin fired
+        if self.masks is None:
+            return len(self.xs)
+        return sum(bin(mask).count("1") for mask in self.masks)
+
+    def fixed(self):
+        return zip(self.xs, self.ys)
+
+    def take(self, order):
+        # New store holding the dots at the given indices, in that order
+        xs, ys, masks = self.xs, self.ys, self.masks
+        return DotStore(array('i', [xs[i] for i in order]), array('i', [ys[i] for i in order]),
+                        None if masks is None else array('I', [masks[i] for i in order]))
+
+    def sorted_indices(self, axis="y"):
+        primary, secondary = (self.ys, self.xs) if axis == "y" else (self.xs, self.ys)
+        return sorted(range(len(primary)), key=lambda i: (primary[i], secondary[i]))
+
+    def unique(self):
+        # Drops repeated positions, keeping the first occurrence of each.
+        # Pin masks of repeats are merged into it, one strike fires them all.
+        seen = {}
+        order = []
+        masks = self.masks
+        merged = None
+        for i, position in enumerate(zip(self.xs, self.ys)):
+            first = seen.get(position)
+            if first is None:
+                seen[position] = i
+                order.append(i)
+            elif masks is not None:
+                if merged is None:
+                    merged = array('I', masks)
+                merged[first] |= masks[i]
+        if len(order) == len(self.xs):
+            return self
+        if merged is not None:
+            return DotStore(self.xs, self.ys, merged).take(order)
+        return self.take(order)
+
+    def nbytes(self):
+        size = self.xs.itemsize * len(self.xs) + self.ys.itemsize * len(self.ys)
+        if self.masks is not None:
+            size += self.masks.itemsize * len(self.masks)
+        return size
@@ -0,0 +1,112 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from metrics import log
+
+# Spoken feedback off the critical path. say() only queues the message, a
+# worker thread owns the TTS engine (pyttsx3 wants to be driven from the
+# thread that created it) and speaks the queue in order.
+#   key        messages with the same key coalesce: a newer one replaces the
+#              queued one in its place, so progress ("page 2 of 5") never
+#              piles up behind the embosser
+#   interrupt  drops everything queued and cuts off the message being spoken
+#              at the next word, for errors and anything more urgent
+# When no engine can be started the messages are only logged.
+
+
+def default_engine():
+    import pyttsx3
+    return pyttsx3.init()
+
+
+class Feedback:
+    def __init__(self, engine_factory=default_engine):
+        self.engine_factory = engine_factory
+        self.engine = None
+        self.pending = OrderedDict()   # key -> text
+        self.speaking = None
+        self.speech_ended = 0.0    # time.perf_counter() the last message ended
+        self.interrupted = False
+        self.closed = False
+        self.spoken = 0
+        self.coalesced = 0
+        self.ids = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="feedback", daemon=True)
+        self.thread.start()
+
+    def say(self, text, key=None, interrupt=False):
+        with self.condition:
+            if self.closed:
+                return
+            if interrupt:
+                self.coalesced += len(self.pending)
+                self.pending.clear()
+                self.interrupted = self.speaking is not None
+            if key is None:
+                key = next(self.ids)
+            elif key in self.pending:
+                self.coalesced += 1
+            self.pending[key] = text
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        # Until everything queued has been spoken; False on timeout
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and self.speaking is None, timeout)
+
+    def close(self, drain=True):
+        # Stops the worker, after the queue is spoken unless drain is False
+        with self.condition:
+            self.closed = True
+            if not drain:
+                self.pending.clear()
+                self.interrupted = self.speaking is not None
+            self.condition.notify_all()
+        self.thread.join()
+
+    def spoke_since(self, since):
+        # Whether anything was spoken after since (a time.perf_counter()), so
+        # the microphone may have picked it up
+        with self.condition:
+            return self.speaking is not None or self.speech_ended > since
+
+    def report(self):
+        return f"{self.spoken} messages spoken, {self.coalesced} dropped or coalesced"
+
+    def on_word(self, name, location, length):
+        if self.interrupted:
+            self.engine.stop()
+
+    def run(self):
+        try:
+            self.engine = self.engine_factory()
+            self.engine.connect("started-word", self.on_word)
+        except Exception as error:
+            log.warning("No speech output, feedback is only logged: %s", error)
+            self.engine = None
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    break
+                key, text = self.pending.popitem(last=False)
+                self.speaking = text
+                self.interrupted = False
+            log.debug("Saying: %s", text)
+            start = time.perf_counter()
+            if self.engine is not None:
+                try:
+                    self.engine.say(text)
+                    self.engine.runAndWait()
+                except Exception:
+                    log.exception("Speech output failed")
+            metrics.job().add_time("speech_feedback", time.perf_counter() - start)
+            with self.condition:
+                self.speaking = None
+                self.speech_ended = time.perf_counter()
+                self.spoken += 1
+                self.condition.notify_all()
@@ -0,0 +1,17 @@
+# Collects G-code text for BrailleGCodeGenerator without repeated string
+# concatenation. Tokens are appended to a list and joined once at the end, or
+# written straight through to a file-like sink (open file, socket wrapper,
+# io.StringIO ...) so generation stays linear in the number of dots.
+class GcodeEmitter:
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.parts = []
+        self.write = sink.write if sink is not None else self.parts.append
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def getvalue(self):
+        # Nothing is buffered when streaming to a sink
+        return "".join(self.parts)
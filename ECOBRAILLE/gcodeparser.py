@@ -0,0 +1,85 @@
+import io
+import re
+
+# G-code tokenizer shared by the executor and the job converter.
+# One precompiled pattern finds every word of a line, a table says which
+# attribute it fills and how it is typed. Letters without a value (G28 X)
+# are kept in axes, anything not in the table (N, T, E ...) is skipped.
+WORD = re.compile(r"([A-Za-z])\s*([-+]?(?:\d+\.?\d*|\.\d+)?)")
+COMMENT = re.compile(r"\([^)]*\)")
+
+
+def code(value):
+    # G and M numbers: int unless there is a subcode (G28.1)
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+WORDS = {
+    'G': ('g', code),
+    'M': ('m', code),
+    'X': ('x', float),
+    'Y': ('y', float),
+    'Z': ('z', float),
+    'F': ('f', float),
+    'S': ('s', float),
+    'P': ('p', float),
+}
+
+
+class GcodeCommand:
+    __slots__ = ("g", "m", "x", "y", "z", "f", "s", "p", "axes")
+
+    def __init__(self):
+        self.g = self.m = self.x = self.y = self.z = self.f = self.s = self.p = None
+        self.axes = ""
+
+    def __repr__(self):
+        words = [f"{name.upper()}{getattr(self, name)}" for name in self.__slots__[:-1]
+                 if getattr(self, name) is not None]
+        return " ".join(words + list(self.axes))
+
+
+def parse_line(line):
+    # GcodeCommand for one line, None for blank and comment-only lines
+    if ';' in line:
+        line = line.split(';', 1)[0]
+    if '(' in line:
+        line = COMMENT.sub("", line)
+    words = WORD.findall(line)
+    if not words:
+        return None
+    command = GcodeCommand()
+    for letter, value in words:
+        letter = letter.upper()
+        if not value:
+            command.axes += letter
+            continue
+        entry = WORDS.get(letter)
+        if entry is not None:
+            setattr(command, entry[0], entry[1](value))
+    return command
+
+
+def iter_lines(source):
+    # Whole lines from a string, an open file or any iterable of text chunks.
+    # Chunks may end anywhere, a partial line waits for the rest.
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    rest = ""
+    for chunk in source:
+        if rest:
+            chunk = rest + chunk
+        lines = chunk.split('\n')
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def parse_stream(source):
+    # Commands from a G-code source as they are read, see iter_lines
+    for line in iter_lines(source):
+        command = parse_line(line)
+        if command is not None:
+            yield command
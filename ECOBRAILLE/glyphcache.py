@@ -0,0 +1,79 @@
+# Compiles a braille language table into per-character dot offsets so the
+# generator does one dict lookup and an add per dot instead of scanning the
+# cell grid and redoing the paper -> machine transform for every character.
+
+# BRAILLE settings that change the compiled offsets
+GLYPH_SETTINGS = ("language", "letterWidth", "dotRadius", "invertX", "mirrorX", "mirrorY", "head")
+
+# Embossing heads. A "single" pin head strikes every dot on its own. A
+# "column" head has one pin per row and strikes a cell column at a time, pin
+# k on row k. A "cell" head has a pin for every dot of the cell and strikes
+# it in one go, pin k = column * rows + row (dot k + 1 in a standard map).
+HEADS = ("single", "column", "cell")
+
+
+def axis_signs(braille):
+    # Paper x/y grow right/down. The generator maps them to machine
+    # coordinates with gx = paperWidth - x (invertX), gy = -y, then negates
+    # for mirrorX/mirrorY; the constant parts belong to the cell origin.
+    sign_x = -1 if braille["invertX"] else 1
+    if braille["mirrorX"]:
+        sign_x = -sign_x
+    sign_y = 1 if braille["mirrorY"] else -1
+    return sign_x, sign_y
+
+
+def compile_glyph(indices, dot_map, spacing_x, spacing_y, sign_x, sign_y, head="single"):
+    # ((dx, dy), ...) per dot for a single pin head, else ((dx, dy, mask), ...)
+    # per strike with dx, dy the offset of the head's first pin
+    if head != "single":
+        return compile_strikes(indices, dot_map, spacing_x, sign_x, head)
+    offsets = []
+    for column, dots in enumerate(dot_map):
+        for row, dot in enumerate(dots):
+            if dot in indices:
+                offsets.append((sign_x * column * spacing_x, sign_y * row * spacing_y))
+    # Row major so a cell is embossed top to bottom
+    offsets.sort(key=lambda offset: (sign_y * offset[1], sign_x * offset[0]))
+    return tuple(offsets)
+
+
+def compile_strikes(indices, dot_map, spacing_x, sign_x, head):
+    if head not in HEADS:
+        raise ValueError(f"Unknown head '{head}', expected one of {HEADS}")
+    rows = max(len(dots) for dots in dot_map)
+    masks = {}
+    for column, dots in enumerate(dot_map):
+        for row, dot in enumerate(dots):
+            if dot in indices:
+                if head == "column":
+                    masks[column] = masks.get(column, 0) | 1 << row
+                else:
+                    masks[0] = masks.get(0, 0) | 1 << (column * rows + row)
+    return tuple((sign_x * column * spacing_x, 0, mask) for column, mask in sorted(masks.items()))
+
+
+def compile_glyphs(braille, languages, spacing_x=None, spacing_y=None, signs=None):
+    # Returns ({char: ((dx, dy), ...)}, number prefix offsets). Letters are
+    # entered in both cases so callers never need char.lower().
+    language = languages[braille["language"]]
+    spacing_x = braille["letterWidth"] if spacing_x is None else spacing_x
+    spacing_y = braille["letterWidth"] if spacing_y is None else spacing_y
+    sign_x, sign_y = axis_signs(braille) if signs is None else signs
+    dot_map = language["dotMap"]
+    head = braille["head"]
+
+    glyphs = {}
+    for char, indices in language["latinToBraille"].items():
+        glyph = compile_glyph(indices, dot_map, spacing_x, spacing_y, sign_x, sign_y, head)
+        glyphs[char] = glyph
+        glyphs.setdefault(char.upper(), glyph)
+    number_prefix = compile_glyph(language["numberPrefix"], dot_map, spacing_x, spacing_y, sign_x, sign_y, head)
+    return glyphs, number_prefix
+
+
+def glyph_config_key(braille, languages):
+    language = languages[braille["language"]]
+    table = tuple((char, tuple(indices)) for char, indices in language["latinToBraille"].items())
+    return (tuple(braille[name] for name in GLYPH_SETTINGS), table,
+            tuple(map(tuple, language["dotMap"])), tuple(language["numberPrefix"]))
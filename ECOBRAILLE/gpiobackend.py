@@ -0,0 +1,336 @@
+import os
+import time
+from array import array
+from collections import namedtuple
+
+import metrics
+from metrics import log
+from stepschedule import PULSE_WIDTH_NS, pins_in_mask
+
+# Pin backends for the motion controller. All expose the same small surface
+# the executor needs: setup_output, output, output_mask (several pins at once
+# by GPIO bitmask), sleep, now, play_schedule and cleanup.
+#   RPiGPIOBackend       - the real pins through RPi.GPIO (BCM numbering),
+#                          step schedules played from a busy-wait loop
+#   PigpioWaveBackend    - pins through the pigpio daemon, step schedules
+#                          sent as DMA timed waveforms
+#   SimulatedGPIOBackend - in memory, keeps a virtual clock instead of
+#                          sleeping and records every pin edge
+# Pick one with ECOBRAILLE_GPIO=rpi|pigpio|sim|pigpio-sim, by default RPi.GPIO
+# is used when it can be imported.
+LOW = 0
+HIGH = 1
+# pigpio constants, so the wave code runs without pigpio installed
+PIGPIO_OUTPUT = 1
+WAVE_MODE_ONE_SHOT_SYNC = 2
+Pulse = namedtuple("Pulse", "gpio_on gpio_off delay")
+# A busy-wait pulse this far behind its slot (the process was preempted) is
+# counted late, and the schedule goes on from it
+LATE_PULSE_NS = 50000
+
+
+class RPiGPIOBackend:
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        self.late_pulses = 0
+
+    def setup_output(self, pin):
+        self.GPIO.setup(pin, self.GPIO.OUT)
+
+    def output(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def output_mask(self, mask, value):
+        self.GPIO.output(pins_in_mask(mask), value)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        return time.perf_counter()
+
+    def play_schedule(self, schedule):
+        # Busy-waits on a deadline instead of sleeping per pulse, sleeps
+        # overshoot by tens of microseconds on Linux. After a stall the
+        # deadline moves up to now instead of firing the missed pulses back
+        # to back, the move takes longer but keeps its step spacing.
+        GPIO = self.GPIO
+        for pin, level in schedule.directions:
+            GPIO.output(pin, level)
+        groups = {}
+        clock = time.perf_counter_ns
+        late = 0
+        deadline = clock()
+        for mask, delay in schedule:
+            pins = groups.get(mask)
+            if pins is None:
+                pins = groups[mask] = pins_in_mask(mask)
+            now = clock()
+            if now - deadline > LATE_PULSE_NS:
+                late += 1
+                deadline = now
+            GPIO.output(pins, HIGH)
+            pulse_end = now + PULSE_WIDTH_NS
+            while clock() < pulse_end:
+                pass
+            GPIO.output(pins, LOW)
+            deadline += delay
+            while clock() < deadline:
+                pass
+        if late:
+            self.late_pulses += late
+            metrics.count("late_pulses", late)
+            log.warning("%d of %d step pulses were late", late, len(schedule))
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class PigpioWaveBackend:
+    # Waves are built a chunk at a time and chained with ONE_SHOT_SYNC, the
+    # next chunk is created while the previous one is being transmitted
+    MAX_PULSES_PER_WAVE = 8000
+
+    def __init__(self, pi=None):
+        if pi is None:
+            import pigpio
+            pi = pigpio.pi()
+            if not pi.connected:
+                raise RuntimeError("Could not connect to the pigpio daemon")
+            self.pulse = pigpio.pulse
+        else:
+            self.pulse = Pulse
+        self.pi = pi
+
+    def setup_output(self, pin):
+        self.pi.set_mode(pin, PIGPIO_OUTPUT)
+
+    def output(self, pin, value):
+        self.pi.write(pin, value)
+
+    def output_mask(self, mask, value):
+        # One register write for the whole bank, the pins switch together
+        if value:
+            self.pi.set_bank_1(mask)
+        else:
+            self.pi.clear_bank_1(mask)
+
+    def sleep(self, seconds):
+        if hasattr(self.pi, "sleep"):
+            self.pi.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def now(self):
+        if hasattr(self.pi, "now"):
+            return self.pi.now()
+        return time.perf_counter()
+
+    def play_schedule(self, schedule):
+        pi = self.pi
+        for pin, level in schedule.directions:
+            pi.write(pin, level)
+        sent = []
+        chunk = []
+        for pulse in schedule.to_pulses(self.pulse):
+            chunk.append(pulse)
+            if len(chunk) >= self.MAX_PULSES_PER_WAVE:
+                self.queue_wave(chunk, sent)
+                chunk = []
+        if chunk:
+            self.queue_wave(chunk, sent)
+        while pi.wave_tx_busy():
+            self.sleep(0.001)
+        for wave in sent:
+            pi.wave_delete(wave)
+
+    def queue_wave(self, pulses, sent):
+        # At most one wave on air and one queued behind it
+        pi = self.pi
+        if len(sent) >= 2:
+            while pi.wave_tx_at() == sent[0]:
+                self.sleep(0.001)
+            pi.wave_delete(sent.pop(0))
+        pi.wave_add_generic(pulses)
+        wave = pi.wave_create()
+        pi.wave_send_using_mode(wave, WAVE_MODE_ONE_SHOT_SYNC)
+        sent.append(wave)
+
+    def cleanup(self):
+        self.pi.stop()
+
+
+class SimulatedGPIOBackend:
+    def __init__(self, step_pins=(), solenoid_pins=(), solenoid_active=LOW, record_edges=True, realtime=False):
+        # step_pins count a step on every rising edge, solenoid_pins count a
+        # strike on every change to solenoid_active (the relay is active low)
+        self.step_pins = set(step_pins)
+        self.solenoid_pins = set(solenoid_pins)
+        self.solenoid_active = solenoid_active
+        self.record_edges = record_edges
+        self.realtime = realtime
+        self.reset()
+
+    def reset(self):
+        self.clock = 0.0
+        self.levels = {}
+        self.steps = {pin: 0 for pin in self.step_pins}
+        self.strikes = 0
+        # Edges as parallel arrays: time (s), pin, new level
+        self.edge_times = array('d')
+        self.edge_pins = array('B')
+        self.edge_levels = array('B')
+
+    def setup_output(self, pin):
+        # Solenoids start released, everything else low
+        if pin in self.solenoid_pins:
+            self.levels.setdefault(pin, 1 - self.solenoid_active)
+        else:
+            self.levels.setdefault(pin, LOW)
+
+    def output(self, pin, value):
+        value = HIGH if value else LOW
+        previous = self.levels.get(pin)
+        if previous == value:
+            return
+        self.levels[pin] = value
+        if self.record_edges:
+            self.edge_times.append(self.clock)
+            self.edge_pins.append(pin)
+            self.edge_levels.append(value)
+        if pin in self.step_pins and value == HIGH:
+            self.steps[pin] += 1
+        elif pin in self.solenoid_pins and value == self.solenoid_active:
+            self.strikes += 1
+
+    def output_mask(self, mask, value):
+        for pin in pins_in_mask(mask):
+            self.output(pin, value)
+
+    def sleep(self, seconds):
+        self.clock += seconds
+        if self.realtime:
+            time.sleep(seconds)
+
+    def now(self):
+        return self.clock
+
+    def play_schedule(self, schedule):
+        # Same edges and timing as the real playback, on the virtual clock
+        for pin, level in schedule.directions:
+            self.output(pin, level)
+        groups = {}
+        pulse_width = PULSE_WIDTH_NS / 1e9
+        for mask, delay in schedule:
+            pins = groups.get(mask)
+            if pins is None:
+                pins = groups[mask] = pins_in_mask(mask)
+            for pin in pins:
+                self.output(pin, HIGH)
+            self.clock += pulse_width
+            for pin in pins:
+                self.output(pin, LOW)
+            self.clock += delay / 1e9 - pulse_width
+        if self.realtime:
+            time.sleep(schedule.duration_ns() / 1e9)
+
+    def cleanup(self):
+        pass
+
+    def edges(self):
+        return zip(self.edge_times, self.edge_pins, self.edge_levels)
+
+    def report(self):
+        steps = ", ".join(f"pin {pin}: {count}" for pin, count in sorted(self.steps.items()))
+        return (f"simulated {self.clock:.2f} s, {len(self.edge_times)} edges, "
+                f"steps ({steps}), {self.strikes} solenoid strikes")
+
+
+class SimulatedPigpio:
+    # Stands in for pigpio.pi(): the subset of the wave API PigpioWaveBackend
+    # uses, transmitting each wave instantly onto a SimulatedGPIOBackend
+    def __init__(self, **simulator_options):
+        self.simulator = SimulatedGPIOBackend(**simulator_options)
+        self.pending = []
+        self.waves = {}
+        self.next_wave = 0
+        self.waves_sent = 0
+
+    def set_mode(self, pin, mode):
+        self.simulator.setup_output(pin)
+
+    def write(self, pin, value):
+        self.simulator.output(pin, value)
+
+    def set_bank_1(self, mask):
+        self.simulator.output_mask(mask, HIGH)
+
+    def clear_bank_1(self, mask):
+        self.simulator.output_mask(mask, LOW)
+
+    def sleep(self, seconds):
+        self.simulator.sleep(seconds)
+
+    def now(self):
+        return self.simulator.now()
+
+    def wave_clear(self):
+        self.pending = []
+        self.waves = {}
+
+    def wave_add_generic(self, pulses):
+        self.pending.extend(pulses)
+        return len(self.pending)
+
+    def wave_create(self):
+        wave = self.next_wave
+        self.next_wave += 1
+        self.waves[wave] = self.pending
+        self.pending = []
+        return wave
+
+    def wave_send_using_mode(self, wave, mode):
+        simulator = self.simulator
+        for pulse in self.waves[wave]:
+            for pin in pins_in_mask(pulse.gpio_on):
+                simulator.output(pin, HIGH)
+            for pin in pins_in_mask(pulse.gpio_off):
+                simulator.output(pin, LOW)
+            simulator.sleep(pulse.delay / 1e6)
+        self.waves_sent += 1
+        return len(self.waves[wave])
+
+    def wave_tx_busy(self):
+        return 0
+
+    def wave_tx_at(self):
+        return 9999
+
+    def wave_delete(self, wave):
+        self.waves.pop(wave, None)
+
+    def stop(self):
+        pass
+
+    def report(self):
+        return f"{self.waves_sent} waves, " + self.simulator.report()
+
+
+def get_backend(name=None, **simulator_options):
+    name = name or os.environ.get("ECOBRAILLE_GPIO")
+    if name == "sim":
+        return SimulatedGPIOBackend(**simulator_options)
+    if name == "pigpio-sim":
+        return PigpioWaveBackend(SimulatedPigpio(**simulator_options))
+    if name == "rpi":
+        return RPiGPIOBackend()
+    if name == "pigpio":
+        return PigpioWaveBackend()
+    try:
+        return RPiGPIOBackend()
+    except ImportError:
+        log.warning("RPi.GPIO is not available, using the simulated GPIO backend")
+        return SimulatedGPIOBackend(**simulator_options)
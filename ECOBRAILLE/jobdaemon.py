@@ -0,0 +1,443 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from metrics import JobMetrics, log
+import newbrailecombine1 as embosser
+from jobformat import Job, braille_to_job, gcode_to_job
+
+# Embossing job queue that stays up between documents, with a small HTTP API
+# on localhost:
+#   POST   /jobs        {"text": ..., "priority": 0, "name": ...} or
+#                       {"gcode": ...}, returns the job
+#   GET    /jobs        every job, GET /jobs/<id> one of them
+#   DELETE /jobs/<id>   cancels it, queued or embossing
+#   POST   /jobs/<id>/resume   the next sheet is in, see below
+#   GET    /status      queue depth, waits, pages per hour
+#   GET    /metrics     the same as Prometheus text
+# Jobs are spooled to disk (ECOBRAILLE_SPOOL): <id>.json holds the state,
+# <id>.txt / .gcode what was submitted and <id>.ebj the compiled job. Queued
+# jobs survive a restart, one that was embossing is marked interrupted
+# rather than started again on a half embossed sheet.
+# Higher priority runs first, equal priorities in submission order. A
+# translation thread compiles queued jobs ahead while the current one
+# embosses, so the next one starts as soon as the head is free. The work
+# itself runs in a separate process: a translation thread would hold the GIL
+# against RPiGPIOBackend's busy-wait step loop. Its spans and counters are
+# added to the job's own metrics when the job runs.
+# At a page change the job goes to waiting_for_paper with the head parked
+# until it is resumed or cancelled, nothing is read from the console.
+SPOOL = os.path.expanduser("~/.ecobraille/spool")
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+def translate_job(task):
+    # Runs in the translation process: compiles a spooled job to .ebj and
+    # estimates it. Returns the JobEstimate and the translation's metrics as
+    # JobMetrics.to_dict().
+    generator_class, braille, languages, actuator, name, source, target = task
+    job = JobMetrics(name)
+    with open(source) as file:
+        content = file.read()
+    with job.span("translation_ahead"), open(target + ".tmp", "wb") as sink:
+        if source.endswith(".txt"):
+            generator = generator_class()
+            generator.BRAILLE = braille
+            generator.LANGUAGES = languages
+            braille_to_job(generator, content, sink, embosser.STEPSPERMM, job)
+        else:
+            gcode_to_job(content, sink, embosser.STEPSPERMM)
+    os.replace(target + ".tmp", target)
+    # Timed with the daemon's solenoid model, which may be calibrated
+    embosser.actuator = actuator
+    return embosser.EstimateJob(Job.open(target)), job.to_dict()
+
+
+class JobDaemon:
+    def __init__(self, spool=None, generator=None):
+        self.spool = spool or os.environ.get("ECOBRAILLE_SPOOL", SPOOL)
+        os.makedirs(self.spool, exist_ok=True)
+        self.generator = generator or embosser.BrailleGCodeGenerator()
+        self.jobs = {}
+        self.queue = []         # heap of (-priority, submitted, id)
+        self.current = None
+        self.paper_loaded = False
+        self.estimates = {}     # id -> JobEstimate of the translated jobs
+        self.translations = {}  # id -> metrics of their translation
+        self.stopping = False
+        self.condition = threading.Condition()
+        self.stats = JobMetrics("queue")
+        self.first_started = None
+        self.load()
+
+    def path(self, job_id, extension):
+        return os.path.join(self.spool, job_id + extension)
+
+    def save(self, job):
+        temporary = self.path(job["id"], ".json.tmp")
+        with open(temporary, "w") as file:
+            json.dump(job, file, indent=2)
+        os.replace(temporary, self.path(job["id"], ".json"))
+
+    def load(self):
+        for name in sorted(os.listdir(self.spool)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.spool, name)) as file:
+                job = json.load(file)
+            if job["state"] in ("embossing", "waiting_for_paper"):
+                job["state"] = "interrupted"
+                self.save(job)
+            self.jobs[job["id"]] = job
+            if job["state"] == "queued":
+                heapq.heappush(self.queue, (-job["priority"], job["submitted"], job["id"]))
+        if self.jobs:
+            log.info("Spool %s: %d jobs, %d queued", self.spool, len(self.jobs), len(self.queue))
+
+    def submit(self, text=None, gcode=None, priority=0, name=None):
+        if (text is None) == (gcode is None):
+            raise ValueError("A job needs either text or gcode")
+        job_id = uuid.uuid4().hex[:12]
+        source = self.path(job_id, ".txt" if text is not None else ".gcode")
+        with open(source, "w") as file:
+            file.write(text if text is not None else gcode)
+        job = {"id": job_id, "name": name or job_id, "priority": int(priority), "state": "queued",
+               "source": os.path.basename(source), "translated": False, "submitted": time.time(),
+               "started": None, "finished": None, "page": None, "pages": None, "estimate_seconds": None,
+               "counters": None, "error": None}
+        with self.condition:
+            self.jobs[job_id] = job
+            self.save(job)
+            heapq.heappush(self.queue, (-job["priority"], job["submitted"], job_id))
+            self.condition.notify_all()
+        log.info("Job %s queued with priority %d", job["name"], job["priority"])
+        return dict(job)
+
+    def cancel(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job["state"] == "queued":
+                job["state"] = "cancelled"
+                job["finished"] = time.time()
+                self.save(job)
+            elif job["state"] in ("embossing", "waiting_for_paper"):
+                job["error"] = "cancelled"
+                embosser.abort.set()
+            self.condition.notify_all()
+            return dict(job)
+
+    def resume(self, job_id):
+        # The next sheet is in, returns the job (unchanged unless it was
+        # waiting for paper) or None
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job["state"] == "waiting_for_paper":
+                self.paper_loaded = True
+                self.condition.notify_all()
+            return dict(job)
+
+    def wait_for_paper(self):
+        # embosser.page_change_handler while a job runs
+        with self.condition:
+            job = self.jobs[self.current]
+            job["state"] = "waiting_for_paper"
+            job["page"] += 1
+            self.paper_loaded = False
+            self.save(job)
+            log.info("Job %s: insert sheet %d and resume the job", job["name"], job["page"])
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: self.paper_loaded or embosser.abort.is_set())
+            job["state"] = "embossing"
+            self.save(job)
+
+    def status(self, job_id=None):
+        with self.condition:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return dict(job) if job is not None else None
+            return sorted((dict(job) for job in self.jobs.values()), key=lambda job: job["submitted"])
+
+    def queued(self):
+        # Queued jobs in the order they will run, drops stale heap entries
+        while self.queue and self.jobs[self.queue[0][2]]["state"] != "queued":
+            heapq.heappop(self.queue)
+        return [self.jobs[job_id] for priority, submitted, job_id in sorted(self.queue)
+                if self.jobs[job_id]["state"] == "queued"]
+
+    def report(self):
+        with self.condition:
+            queued = self.queued()
+            done = [job for job in self.jobs.values() if job["state"] == "done"]
+            waits = [job["started"] - job["submitted"] for job in self.jobs.values() if job["started"]]
+            pages = sum(job["pages"] or 0 for job in done)
+            hours = (time.time() - self.first_started) / 3600 if self.first_started else 0
+            report = {
+                "queue_depth": len(queued),
+                "translated_ahead": sum(job["translated"] for job in queued),
+                "queued_seconds": sum(job["estimate_seconds"] or 0 for job in queued),
+                "embossing": self.current,
+                "waiting_for_paper": self.current is not None
+                                     and self.jobs[self.current]["state"] == "waiting_for_paper",
+                "done": len(done),
+                "failed": sum(job["state"] in ("failed", "interrupted") for job in self.jobs.values()),
+                "cancelled": sum(job["state"] == "cancelled" for job in self.jobs.values()),
+                "mean_wait": sum(waits) / len(waits) if waits else 0.0,
+                "longest_wait": max(waits, default=0.0),
+                "pages": pages,
+                "pages_per_hour": pages / hours if hours else 0.0,
+            }
+        for name, value in report.items():
+            if name not in ("embossing", "waiting_for_paper"):
+                self.stats.set(name, value)
+        return report
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            embosser.abort.set()
+            self.condition.notify_all()
+
+    def next_untranslated(self):
+        for job in self.queued():
+            if not job["translated"]:
+                return job
+        return None
+
+    def translate_thread(self, pool):
+        # Compiles queued jobs to .ebj in the order they will run, on pool
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopping or self.next_untranslated() is not None)
+                if self.stopping:
+                    return
+                job = self.next_untranslated()
+                source = self.path(job["id"], "")
+                task = (type(self.generator), self.generator.BRAILLE, self.generator.LANGUAGES, embosser.actuator,
+                        job["name"], source + os.path.splitext(job["source"])[1], source + ".ebj")
+            try:
+                estimate, translation = pool.submit(translate_job, task).result()
+                error = None
+            except Exception as exception:
+                log.exception("Job %s could not be translated", job["name"])
+                error = str(exception)
+            with self.condition:
+                if error is not None:
+                    job["state"] = "failed"
+                    job["error"] = error
+                    job["finished"] = time.time()
+                else:
+                    job["translated"] = True
+                    self.estimates[job["id"]] = estimate
+                    self.translations[job["id"]] = translation
+                    job["pages"] = len(estimate.pages)
+                    job["estimate_seconds"] = estimate.total_seconds
+                self.save(job)
+                self.condition.notify_all()
+
+    def next_job(self):
+        # Waits until the job that should run next is compiled
+        with self.condition:
+            while not self.stopping:
+                queued = self.queued()
+                if queued and queued[0]["translated"]:
+                    job = queued[0]
+                    job["state"] = "embossing"
+                    job["page"] = 1
+                    job["started"] = time.time()
+                    self.current = job["id"]
+                    self.first_started = self.first_started or job["started"]
+                    embosser.abort.clear()
+                    self.save(job)
+                    self.stats.add_time("queue_wait", job["started"] - job["submitted"])
+                    return job
+                self.condition.wait()
+        return None
+
+    def emboss(self, job):
+        job_metrics = metrics.new_job(job["name"])
+        translation = self.translations.pop(job["id"], None)
+        if translation is not None:
+            job_metrics.merge(translation)
+        log.info("Embossing %s, %d pages, about %.1f min", job["name"], job["pages"], job["estimate_seconds"] / 60)
+        error = None
+        try:
+            # Every program ends with the motors off
+            embosser.EnableMotors()
+            embosser.ProcessJob(self.path(job["id"], ".ebj"), self.estimates.pop(job["id"], None))
+        except Exception as exception:
+            log.exception("Job %s failed", job["name"])
+            error = str(exception)
+        finally:
+            embosser.DisableMotors()
+        with self.condition:
+            job["finished"] = time.time()
+            if error is not None:
+                job["state"] = "failed"
+                job["error"] = error
+            elif embosser.abort.is_set():
+                job["state"] = "cancelled" if job["error"] == "cancelled" else "interrupted"
+            else:
+                job["state"] = "done"
+            job["counters"] = dict(job_metrics.counters)
+            self.current = None
+            self.save(job)
+            self.condition.notify_all()
+        metrics.dump_job()
+        log.info("Job %s %s; queue: %s", job["name"], job["state"], self.report())
+
+    def run(self, backend=None):
+        # Embosses until stop(); translation runs on its own thread
+        embosser.SetupPins(backend)
+        embosser.page_change_handler = self.wait_for_paper
+        # Spawned rather than forked, a fork would copy locks held by the
+        # embossing and HTTP threads
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            translator = threading.Thread(target=self.translate_thread, args=(pool,), name="translator",
+                                          daemon=True)
+            translator.start()
+            while True:
+                job = self.next_job()
+                if job is None:
+                    break
+                self.emboss(job)
+            translator.join()
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    def reply(self, code, body, content_type="application/json"):
+        data = (body if isinstance(body, str) else json.dumps(body, indent=2)).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def job_id(self):
+        return self.path[len("/jobs/"):] if self.path.startswith("/jobs/") else None
+
+    def do_GET(self):
+        daemon = self.server.job_daemon
+        if self.path == "/jobs":
+            self.reply(200, daemon.status())
+        elif self.path == "/status":
+            self.reply(200, daemon.report())
+        elif self.path == "/metrics":
+            daemon.report()
+            self.reply(200, daemon.stats.to_prometheus(), "text/plain; version=0.0.4")
+        elif self.job_id():
+            job = daemon.status(self.job_id())
+            if job is None:
+                self.reply(404, {"error": "no such job"})
+            else:
+                self.reply(200, job)
+        else:
+            self.reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.job_id() and self.path.endswith("/resume"):
+            job = self.server.job_daemon.resume(self.job_id()[:-len("/resume")])
+            if job is None:
+                self.reply(404, {"error": "no such job"})
+            elif job["state"] != "waiting_for_paper":
+                self.reply(409, {"error": f"job is {job['state']}, not waiting for paper"})
+            else:
+                self.reply(200, job)
+            return
+        if self.path != "/jobs":
+            self.reply(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            job = self.server.job_daemon.submit(request.get("text"), request.get("gcode"),
+                                                request.get("priority", 0), request.get("name"))
+        except (ValueError, TypeError, AttributeError) as error:
+            self.reply(400, {"error": str(error)})
+            return
+        self.reply(201, job)
+
+    def do_DELETE(self):
+        job = self.server.job_daemon.cancel(self.job_id()) if self.job_id() else None
+        if job is None:
+            self.reply(404, {"error": "no such job"})
+        else:
+            self.reply(200, job)
+
+    def log_message(self, format, *args):
+        log.debug("%s " + format, self.address_string(), *args)
+
+
+def serve(host=HOST, port=PORT, spool=None, backend=None):
+    daemon = JobDaemon(spool)
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.job_daemon = daemon
+    threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    log.info("Job daemon listening on http://%s:%d, spool %s", host, server.server_port, daemon.spool)
+    try:
+        daemon.run(backend)
+    except KeyboardInterrupt:
+        log.info("Job daemon stopped")
+        daemon.stop()
+    finally:
+        server.shutdown()
+    return daemon
+
+
+def request(method, path, body=None, host=HOST, port=PORT):
+    data = json.dumps(body).encode() if body is not None else None
+    call = urllib.request.Request(f"http://{host}:{port}{path}", data, method=method,
+                                  headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(call) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embossing job daemon and its client")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ECOBRAILLE_PORT", PORT)))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve")
+    submit = commands.add_parser("submit", help="queue a text file, or G-code with --gcode")
+    submit.add_argument("file")
+    submit.add_argument("--priority", type=int, default=0)
+    submit.add_argument("--gcode", action="store_true")
+    status = commands.add_parser("status")
+    status.add_argument("job", nargs="?")
+    cancel = commands.add_parser("cancel")
+    cancel.add_argument("job")
+    resume = commands.add_parser("resume", help="the next sheet is in")
+    resume.add_argument("job")
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(port=args.port)
+        return
+    if args.command == "submit":
+        with open(args.file) as file:
+            content = file.read()
+        body = {"gcode" if args.gcode else "text": content, "priority": args.priority,
+                "name": os.path.basename(args.file)}
+        result = request("POST", "/jobs", body, port=args.port)
+    elif args.command == "status":
+        result = request("GET", f"/jobs/{args.job}" if args.job else "/status", port=args.port)
+    elif args.command == "resume":
+        result = request("POST", f"/jobs/{args.job}/resume", port=args.port)
+    else:
+        result = request("DELETE", f"/jobs/{args.job}", port=args.port)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    metrics.configure_logging()
+    main()
@@ -0,0 +1,128 @@
+import time
+
+from jobformat import gcode_to_records, iter_job_records, plan_records
+from metrics import JobMetrics
+from motionplanner import Move, MotionPlanner
+from pathplanner import PathPlanner
+from solenoid import SolenoidModel
+
+# Dry run of a job on the motion planner and solenoid model the executor
+# uses, without generating a single step: moves are timed from their
+# velocity profiles and the solenoid waits are worked out on a virtual clock
+# exactly as Strike / RunAction would wait on the pins. The actions are the
+# executor's, from jobformat.plan_records. Pages are split at the page change
+# pause, the time the user takes to swap sheets is not included.
+
+
+class EstimateClock:
+    # Stands in for the pin backend's now/sleep
+    def __init__(self):
+        self.clock = 0.0
+
+    def now(self):
+        return self.clock
+
+    def sleep(self, seconds):
+        self.clock += seconds
+
+
+class JobEstimate:
+    def __init__(self):
+        self.dots = 0
+        self.strikes = 0
+        self.moves = 0
+        self.travel_mm = 0.0
+        self.motion_seconds = 0.0
+        self.solenoid_seconds = 0.0
+        self.pages = []         # seconds per page
+        self.computed_in = 0.0  # s spent on the estimate itself
+
+    @property
+    def total_seconds(self):
+        return sum(self.pages)
+
+    def as_dict(self):
+        return {"dots": self.dots, "strikes": self.strikes, "moves": self.moves,
+                "travel_mm": self.travel_mm, "motion_seconds": self.motion_seconds,
+                "solenoid_seconds": self.solenoid_seconds, "pages": list(self.pages),
+                "total_seconds": self.total_seconds, "computed_in": self.computed_in}
+
+    def report(self):
+        pages = ", ".join(f"{seconds / 60:.1f}" for seconds in self.pages)
+        return (f"{self.dots} dots in {self.strikes} strikes, {len(self.pages)} pages, "
+                f"travel {self.travel_mm / 1000:.2f} m, {self.total_seconds / 60:.1f} min "
+                f"(motion {self.motion_seconds / 60:.1f}, solenoid {self.solenoid_seconds / 60:.1f}), "
+                f"per page [{pages}] min, estimated in {1000 * self.computed_in:.0f} ms")
+
+
+def estimate_records(records, motion=None, solenoid=None, x_limits=None, steps_per_mm=100):
+    # records: (opcode, a, b) from jobformat, a Job or iter_job_records.
+    # motion should be a fresh planner set up like the executor's, solenoid
+    # its model (only the timings are used).
+    start = time.perf_counter()
+    motion = motion if motion is not None else MotionPlanner(steps_per_mm)
+    solenoid = solenoid.copy() if solenoid is not None else SolenoidModel()
+    clock = EstimateClock()
+    estimate = JobEstimate()
+    page_start = 0.0
+
+    def run(moves):
+        for move in moves:
+            duration = move.duration
+            clock.sleep(duration)
+            estimate.motion_seconds += duration
+            estimate.travel_mm += move.length
+            estimate.moves += 1
+
+    for item in plan_records(records, motion, x_limits, steps_per_mm):
+        if isinstance(item, Move):
+            run([item])
+            continue
+        before = clock.now()
+        kind = item[0]
+        if kind == "strike":
+            solenoid.fire(clock)
+            clock.sleep(solenoid.pulse_on)
+            solenoid.wait_until(clock, solenoid.release(clock))
+            estimate.strikes += 1
+            estimate.dots += bin(item[1]).count("1") if item[1] else 1
+        elif kind == "solenoid":
+            level, dwell = item[1], item[2]
+            if level == solenoid.active:
+                estimate.strikes += 1
+                estimate.dots += 1
+            if dwell is not None:
+                clock.sleep(dwell)
+            elif level == solenoid.active:
+                solenoid.fire(clock)
+                clock.sleep(solenoid.pulse_on)
+            else:
+                solenoid.wait_until(clock, solenoid.release(clock))
+        elif kind == "page":
+            estimate.pages.append(clock.now() - page_start)
+            page_start = clock.now()
+        estimate.solenoid_seconds += clock.now() - before
+    run(motion.flush())
+    estimate.pages.append(clock.now() - page_start)
+    estimate.computed_in = time.perf_counter() - start
+    return estimate
+
+
+def estimate_job(generator, text, motion=None, solenoid=None, x_limits=None, steps_per_mm=100):
+    # Estimate for what generator.braille_to_gcode(text) would emboss. The dry
+    # run plans on its own planner and counts into a throwaway job, the
+    # generator's path_planner and the running job are left alone.
+    start = time.perf_counter()
+    records = iter_job_records(generator, text, steps_per_mm, JobMetrics("estimate"),
+                               PathPlanner(generator.BRAILLE["pathPlanning"]))
+    estimate = estimate_records(records, motion, solenoid, x_limits, steps_per_mm)
+    estimate.computed_in = time.perf_counter() - start
+    return estimate
+
+
+def estimate_gcode(gcode, motion=None, solenoid=None, x_limits=None, steps_per_mm=100):
+    # Estimate for an existing program (string, open file or chunks)
+    start = time.perf_counter()
+    estimate = estimate_records(gcode_to_records(gcode, steps_per_mm), motion, solenoid, x_limits, steps_per_mm)
+    estimate.computed_in = time.perf_counter() - start
+    return estimate
@@ -0,0 +1,286 @@
+import io
+import mmap
+import struct
+from gcodeparser import parse_stream
+from array import array
+
+# Binary embossing job: a 16 byte header followed by fixed-width records of
+# three little-endian int32 (opcode, a, b). Coordinates are absolute motor
+# steps, so the executor plays a job straight from an mmap with no per-line
+# parsing. With numpy: np.frombuffer(data, "<i4", offset=HEADER.size).reshape(-1, 3)
+#
+#   header: magic b"EBJ1", steps per mm, record count (0 = up to end of
+#           file), reserved
+MAGIC = b"EBJ1"
+HEADER = struct.Struct("<4sIII")
+RECORD = struct.Struct("<iii")
+
+MOVE = 1          # a, b = x, y in steps            G1 X.. Y..
+SOLENOID = 2      # a = pin level                   M3 S..
+FEED = 3          # a = feed in mm/min              G1 F..
+HOME = 4          # a = 1 for X, 2 for Y            G28 X / G28 Y
+PAUSE = 5         # wait for the next sheet         M0
+MOTORS_OFF = 6    #                                 M84
+EMBOSS_CELL = 7   # repeated strike                 G29
+STRIKE = 8        # a = pin mask, 0 single pin      M3 S2 / M3 S2 P..
+OPCODE_NAMES = {MOVE: "MOVE", SOLENOID: "SOLENOID", FEED: "FEED", HOME: "HOME",
+                PAUSE: "PAUSE", MOTORS_OFF: "MOTORS_OFF", EMBOSS_CELL: "EMBOSS_CELL",
+                STRIKE: "STRIKE"}
+# EMBOSS_CELL: solenoid on/off cycles and how long each of on and off lasts
+G29_STRIKES = 10
+G29_DWELL = 0.1 # s
+
+
+def command_records(command, position, steps_per_mm):
+    # (opcode, a, b) records for one parsed command. position holds x, y in
+    # steps for an axis the command leaves out and is updated in place. Only
+    # what the executor acts on is kept, e.g. G90 and Z are dropped.
+    records = []
+    if command.f is not None:
+        records.append((FEED, int(command.f), 0))
+    if command.m == 3 and command.s is not None:
+        if int(command.s) == 2:
+            records.append((STRIKE, int(command.p or 0), 0))
+        else:
+            records.append((SOLENOID, int(command.s), 0))
+    elif command.m == 0:
+        records.append((PAUSE, 0, 0))
+    elif command.m == 84:
+        records.append((MOTORS_OFF, 0, 0))
+    if command.x is not None or command.y is not None:
+        if command.x is not None:
+            position[0] = round(command.x * steps_per_mm)
+        if command.y is not None:
+            position[1] = round(command.y * steps_per_mm)
+        records.append((MOVE, position[0], position[1]))
+    if command.g == 28:
+        # The executor takes wherever the head stands as 0, 0
+        position[:] = [0, 0]
+        records.append((HOME, (1 if 'X' in command.axes else 0) | (2 if 'Y' in command.axes else 0) or 3, 0))
+    elif command.g == 29:
+        records.append((EMBOSS_CELL, 0, 0))
+    return records
+
+
+def gcode_to_records(lines, steps_per_mm):
+    # Text G-code (string, open file or iterable of chunks) to records
+    position = [0, 0]
+    for command in parse_stream(lines):
+        yield from command_records(command, position, steps_per_mm)
+
+
+def record_actions(opcode, a):
+    # What a record other than MOVE and FEED does once the head has stopped,
+    # as the action tuples the executor's RunAction takes. The one table
+    # shared by the executor and the estimate, see plan_records.
+    if opcode == STRIKE:
+        return [("strike", a)]
+    if opcode == SOLENOID:
+        return [("solenoid", a, None)]
+    if opcode == HOME:
+        return [("home",)]
+    if opcode == EMBOSS_CELL:
+        # Fixed on/off cycles instead of the solenoid model
+        return [("solenoid", 1, G29_DWELL), ("solenoid", 0, G29_DWELL)] * G29_STRIKES
+    if opcode == PAUSE:
+        return [("page",)]
+    if opcode == MOTORS_OFF:
+        return [("motors_off",)]
+    raise ValueError(f"Unknown job opcode {opcode}")
+
+
+def plan_records(records, motion, x_limits=None, steps_per_mm=100):
+    # Records through a motion planner: yields the planned motionplanner.Move
+    # objects and record_actions in the order they run. The head comes to a
+    # standstill before anything but a move or a feed change.
+    for opcode, a, b in records:
+        if opcode == MOVE:
+            x = a / steps_per_mm
+            if x_limits is not None:
+                x = max(x_limits[0], min(x_limits[1], x))
+            yield from motion.add(x, b / steps_per_mm)
+        elif opcode == FEED:
+            motion.set_feed(a)
+        else:
+            actions = record_actions(opcode, a)
+            yield from motion.flush()
+            if opcode == HOME:
+                motion.set_position(0, 0)
+            yield from actions
+
+
+def records_to_gcode(records, steps_per_mm):
+    for opcode, a, b in records:
+        if opcode == MOVE:
+            yield f"G1 X{a / steps_per_mm:.2f} Y{b / steps_per_mm:.2f}\r\n"
+        elif opcode == STRIKE:
+            yield f"M3 S2 P{a};\r\n" if a else "M3 S2;\r\n"
+        elif opcode == SOLENOID:
+            yield f"M3 S{a};\r\n"
+        elif opcode == FEED:
+            yield f"G1 F{a};\r\n"
+        elif opcode == HOME:
+            if a & 1:
+                yield "G28 X;\r\n"
+            if a & 2:
+                yield "G28 Y;\r\n"
+        elif opcode == PAUSE:
+            yield "M0;\r\n"
+        elif opcode == MOTORS_OFF:
+            yield "M84;\r\n"
+        elif opcode == EMBOSS_CELL:
+            yield "G29;\r\n"
+        else:
+            raise ValueError(f"Unknown job opcode {opcode}")
+
+
+class JobWriter:
+    def __init__(self, sink=None, steps_per_mm=100):
+        # Without a sink the job is kept in memory, see getvalue()
+        self.sink = sink if sink is not None else io.BytesIO()
+        self.steps_per_mm = steps_per_mm
+        self.count = 0
+        self.buffer = array('i')
+        self.header_at = self.sink.tell() if self.sink.seekable() else None
+        self.sink.write(HEADER.pack(MAGIC, steps_per_mm, 0, 0))
+
+    def write(self, opcode, a=0, b=0):
+        self.buffer.extend((opcode, a, b))
+        if len(self.buffer) >= 3 * 4096:
+            self.flush()
+
+    def records(self, records):
+        for record in records:
+            self.write(*record)
+
+    def move(self, x, y):
+        # x, y in mm
+        self.write(MOVE, round(x * self.steps_per_mm), round(y * self.steps_per_mm))
+
+    def gcode(self, text):
+        self.records(gcode_to_records(text, self.steps_per_mm))
+
+    def flush(self):
+        if self.buffer.itemsize != 4:
+            raise RuntimeError("array('i') is not 32 bit on this platform")
+        buffer = self.buffer
+        if struct.pack("=i", 1) != struct.pack("<i", 1):
+            buffer.byteswap()
+        self.sink.write(buffer.tobytes())
+        self.count += len(self.buffer) // 3
+        self.buffer = array('i')
+
+    def close(self):
+        # Writes what is buffered and, if the sink can seek, the record count
+        self.flush()
+        if self.header_at is not None:
+            end = self.sink.tell()
+            self.sink.seek(self.header_at)
+            self.sink.write(HEADER.pack(MAGIC, self.steps_per_mm, self.count, 0))
+            self.sink.seek(end)
+
+    def getvalue(self):
+        return self.sink.getvalue() if isinstance(self.sink, io.BytesIO) else b""
+
+
+class Job:
+    # A job loaded from bytes or mapped from a file
+    def __init__(self, data):
+        magic, steps_per_mm, count, _ = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an embossing job (bad magic)")
+        self.data = data
+        self.steps_per_mm = steps_per_mm
+        available = (len(data) - HEADER.size) // RECORD.size
+        self.count = count or available
+        if self.count > available:
+            raise ValueError(f"Truncated job: {available} of {self.count} records")
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        view = memoryview(self.data)[HEADER.size:HEADER.size + self.count * RECORD.size]
+        return RECORD.iter_unpack(view)
+
+    def to_gcode(self):
+        return "".join(records_to_gcode(self, self.steps_per_mm))
+
+
+def gcode_to_job(gcode, sink=None, steps_per_mm=100):
+    writer = JobWriter(sink, steps_per_mm)
+    writer.gcode(gcode)
+    writer.close()
+    return writer.getvalue()
+
+
+class RecordSerializer:
+    # Records for BrailleGenerator.iter_program. The configurable G-code
+    # snippets (dot, page change) are converted as they come, the dots
+    # themselves go straight from the planner.
+    def __init__(self, generator, steps_per_mm=100):
+        self.generator = generator
+        self.steps_per_mm = steps_per_mm
+        self.dot = list(gcode_to_records(generator.gcode_print_dot(), steps_per_mm))
+
+    def program_start(self):
+        return gcode_to_records(self.generator.gcode_program_start(), self.steps_per_mm)
+
+    def page_change(self, page):
+        return gcode_to_records(self.generator.gcode_page_change(page), self.steps_per_mm)
+
+    def dots(self, positions):
+        steps_per_mm = self.steps_per_mm
+        records = []
+        if positions.masks is not None:
+            for x, y, mask in positions.strikes():
+                records.append((MOVE, round(x * steps_per_mm), round(y * steps_per_mm)))
+                records.append((STRIKE, mask, 0))
+        else:
+            for x, y in positions:
+                records.append((MOVE, round(x * steps_per_mm), round(y * steps_per_mm)))
+                records.extend(self.dot)
+        return records
+
+    def program_end(self):
+        return gcode_to_records(self.generator.gcode_program_end(), self.steps_per_mm)
+
+
+def iter_job_records(generator, chunks, steps_per_mm=100, job=None, planner=None):
+    # Same program as generator.braille_to_gcode_iter, as (opcode, a, b) records
+    return generator.iter_program(chunks, RecordSerializer(generator, steps_per_mm), job, planner)
+
+
+def braille_to_job(generator, chunks, sink=None, steps_per_mm=100, job=None):
+    writer = JobWriter(sink, steps_per_mm)
+    writer.records(iter_job_records(generator, chunks, steps_per_mm, job))
+    writer.close()
+    return writer.getvalue()
+
+
+if __name__ == "__main__":
+    # python jobformat.py newcode.txt newcode.ebj   G-code to job
+    # python jobformat.py newcode.ebj newcode.txt   job back to G-code
+    import sys
+    if len(sys.argv) != 3:
+        print("usage: python jobformat.py <input> <output>")
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    with open(source, "rb") as file:
+        is_job = file.read(len(MAGIC)) == MAGIC
+    if is_job:
+        job = Job.open(source)
+        with open(target, "w", newline="") as file:
+            file.writelines(records_to_gcode(job, job.steps_per_mm))
+        print(f"{len(job)} records written as G-code to {target}")
+    else:
+        with open(source, "r") as text, open(target, "wb") as file:
+            writer = JobWriter(file)
+            writer.gcode(text)
+            writer.close()
+        print(f"{writer.count} records written to {target}")
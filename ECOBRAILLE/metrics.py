@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# Per-job instrumentation shared by the voice input, the generators and the
+# executor: timing spans (recognition, translation, path_planning,
+# serialization, execution ...) and counters (dots, strikes, moves, steps,
+# travel_mm ...) collected into the current job, dumped as JSON or
+# Prometheus text at the end of it.
+#
+# Messages go through the "ecobraille" logger. INFO shows what the old prints
+# showed apart from the per-command chatter, which is DEBUG now; set
+# ECOBRAILLE_LOG=DEBUG to get it back or WARNING to silence the rest.
+log = logging.getLogger("ecobraille")
+
+
+def configure_logging(level=None):
+    level = level or os.environ.get("ECOBRAILLE_LOG", "INFO")
+    logging.basicConfig(format="%(message)s")
+    log.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+class JobMetrics:
+    def __init__(self, name=None):
+        self.name = name or time.strftime("job-%Y%m%d-%H%M%S")
+        self.started = time.time()
+        self.spans = {}     # name -> [count, seconds, longest]
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def span(self, name):
+        return Span(self, name)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def merge(self, data):
+        # Adds the spans and counters of another job's to_dict(), e.g. of work
+        # done for this job in another process
+        with self.lock:
+            for name, span in data["spans"].items():
+                mine = self.spans.get(name)
+                if mine is None:
+                    self.spans[name] = [span["count"], span["seconds"], span["longest"]]
+                else:
+                    mine[0] += span["count"]
+                    mine[1] += span["seconds"]
+                    mine[2] = max(mine[2], span["longest"])
+            for name, value in data["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job": self.name,
+                "started": self.started,
+                "spans": {name: {"count": count, "seconds": seconds, "longest": longest}
+                          for name, (count, seconds, longest) in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix="ecobraille"):
+        data = self.to_dict()
+        job = data["job"].replace("\\", "\\\\").replace('"', '\\"')
+        lines = []
+        for metric, field in (("span_seconds_total", "seconds"), ("span_count_total", "count")):
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, span in sorted(data["spans"].items()):
+                lines.append(f'{prefix}_{metric}{{job="{job}",span="{name}"}} {span[field]}')
+        for name, value in sorted(data["counters"].items()):
+            metric = f"{prefix}_{re.sub('[^a-zA-Z0-9_]', '_', name)}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f'{metric}{{job="{job}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        # .prom / .txt get Prometheus text, anything else JSON
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w") as file:
+            file.write(text)
+        log.info("Job metrics written to %s", path)
+
+    def report(self):
+        spans = ", ".join(f"{name} {seconds:.3f} s" for name, (count, seconds, longest) in self.spans.items())
+        counters = ", ".join(f"{name} {value:.1f}" if isinstance(value, float) else f"{name} {value}"
+                             for name, value in self.counters.items())
+        return f"{self.name}: {spans}; {counters}"
+
+
+class Span:
+    # with job.span("translation"): ...   adds the elapsed time to the job
+    __slots__ = ("job", "name", "start")
+
+    def __init__(self, job, name):
+        self.job = job
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.job.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+current = JobMetrics()
+
+
+def new_job(name=None):
+    # Starts collecting into a fresh job, returns it
+    global current
+    current = JobMetrics(name)
+    return current
+
+
+def job():
+    return current
+
+
+def span(name):
+    return current.span(name)
+
+
+def count(name, value=1):
+    current.count(name, value)
+
+
+def dump_job(path=None):
+    # Writes the current job to path or $ECOBRAILLE_METRICS, if either is set
+    path = path or os.environ.get("ECOBRAILLE_METRICS")
+    if path:
+        current.dump(path)
+    log.info("Job metrics %s", current.report())
+    return current
+
+
+def count_dots(job, positions):
+    # Strikes and embossed dots of a planned DotStore
+    job.count("strikes", len(positions))
+    job.count("dots", positions.dot_count())
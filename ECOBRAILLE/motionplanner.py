@@ -0,0 +1,162 @@
+import math
+
+# Turns G1 moves into trapezoidal velocity profiles with per-step timing.
+# Moves are queued; the planner looks ahead over the queue to find how fast
+# the head may pass from one move into the next (junction deviation, as in
+# grbl) so chained moves no longer stop in between. flush() ends the chain
+# at standstill, which the executor does before every strike or M command.
+# Distances are mm, speeds mm/s, accelerations mm/s^2, times seconds.
+
+DEFAULT_ACCELERATION = 500.0
+DEFAULT_MAX_SPEED = 80.0
+DEFAULT_JUNCTION_DEVIATION = 0.05
+# Slowest speed a move may start from, avoids endless first steps
+MIN_SPEED = 2.0
+LOOKAHEAD = 16
+
+
+class Move:
+    def __init__(self, start, end, steps_a, steps_b, speed, acceleration):
+        self.start = start
+        self.end = end
+        self.steps_a = steps_a
+        self.steps_b = steps_b
+        self.length = math.hypot(end[0] - start[0], end[1] - start[1])
+        self.unit = ((end[0] - start[0]) / self.length, (end[1] - start[1]) / self.length) if self.length else (0.0, 0.0)
+        self.speed = speed
+        self.acceleration = acceleration
+        self.max_entry_speed = 0.0
+        self.entry_speed = 0.0
+        self.exit_speed = 0.0
+
+    @property
+    def steps(self):
+        return max(abs(self.steps_a), abs(self.steps_b))
+
+    def profile(self):
+        # (accelerate distance, cruise distance, peak speed)
+        a = self.acceleration
+        v0, v1, length = self.entry_speed, self.exit_speed, self.length
+        accelerate = (self.speed ** 2 - v0 ** 2) / (2 * a)
+        decelerate = (self.speed ** 2 - v1 ** 2) / (2 * a)
+        if accelerate + decelerate <= length:
+            return accelerate, length - accelerate - decelerate, self.speed
+        peak = math.sqrt(max(v0 ** 2, v1 ** 2, (2 * a * length + v0 ** 2 + v1 ** 2) / 2))
+        accelerate = min(length, max(0.0, (peak ** 2 - v0 ** 2) / (2 * a)))
+        return accelerate, 0.0, peak
+
+    def time_at(self, s, profile=None):
+        # Time to cover the first s mm of the move
+        accelerate, cruise, peak = profile or self.profile()
+        a = self.acceleration
+        v0 = max(self.entry_speed, MIN_SPEED)
+        if s <= accelerate:
+            return (math.sqrt(v0 ** 2 + 2 * a * s) - v0) / a
+        t = (math.sqrt(v0 ** 2 + 2 * a * accelerate) - v0) / a
+        if s <= accelerate + cruise:
+            return t + (s - accelerate) / peak
+        t += cruise / peak
+        v = math.sqrt(max(peak ** 2 - 2 * a * (s - accelerate - cruise), MIN_SPEED ** 2))
+        return t + (peak - v) / a
+
+    @property
+    def duration(self):
+        return self.time_at(self.length)
+
+    def step_delays(self):
+        # Delay before each step of the busier motor
+        n = self.steps
+        if n == 0:
+            return
+        profile = self.profile()
+        previous = 0.0
+        for i in range(1, n + 1):
+            t = self.time_at(self.length * i / n, profile)
+            yield t - previous
+            previous = t
+
+
+def junction_speed(previous, move, acceleration, deviation):
+    if not previous.length or not move.length:
+        return 0.0
+    cos_theta = -(previous.unit[0] * move.unit[0] + previous.unit[1] * move.unit[1])
+    if cos_theta > 0.999999:
+        # Full reversal
+        return 0.0
+    if cos_theta < -0.999999:
+        # Straight on
+        return min(previous.speed, move.speed)
+    sin_half = math.sqrt((1 - cos_theta) / 2)
+    speed = math.sqrt(acceleration * deviation * sin_half / (1 - sin_half))
+    return min(speed, previous.speed, move.speed)
+
+
+class MotionPlanner:
+    def __init__(self, steps_per_mm, acceleration=DEFAULT_ACCELERATION, max_speed=DEFAULT_MAX_SPEED,
+                 junction_deviation=DEFAULT_JUNCTION_DEVIATION, lookahead=LOOKAHEAD):
+        self.steps_per_mm = steps_per_mm
+        self.acceleration = acceleration
+        self.max_speed = max_speed
+        self.junction_deviation = junction_deviation
+        self.lookahead = lookahead
+        self.speed = max_speed
+        self.queue = []
+        # Exit speed of the last move handed out, the queue starts from it
+        self.exit_speed = 0.0
+        self.set_position(0, 0)
+
+    def set_position(self, x, y):
+        self.position = (x, y)
+        self.step_position = (round(x * self.steps_per_mm), round(y * self.steps_per_mm))
+
+    def set_feed(self, feed):
+        # G-code F is mm/min
+        self.speed = max(MIN_SPEED, min(self.max_speed, feed / 60.0))
+
+    def add(self, x, y):
+        # Queues a move and returns the moves whose profile can no longer
+        # change, ready to be stepped
+        x_steps = round(x * self.steps_per_mm)
+        y_steps = round(y * self.steps_per_mm)
+        dx = x_steps - self.step_position[0]
+        dy = y_steps - self.step_position[1]
+        if dx == 0 and dy == 0:
+            return []
+        # CoreXY: dA = dX + dY and dB = dX - dY
+        move = Move(self.position, (x, y), dx + dy, dx - dy, self.speed, self.acceleration)
+        if self.queue:
+            move.max_entry_speed = junction_speed(self.queue[-1], move, self.acceleration, self.junction_deviation)
+        self.queue.append(move)
+        self.position = (x, y)
+        self.step_position = (x_steps, y_steps)
+        if len(self.queue) > self.lookahead:
+            self.recalculate()
+            move = self.queue.pop(0)
+            self.exit_speed = move.exit_speed
+            return [move]
+        return []
+
+    def flush(self):
+        # Plans everything queued to end at standstill and hands it over
+        self.recalculate()
+        moves = self.queue
+        self.queue = []
+        self.exit_speed = 0.0
+        return moves
+
+    def recalculate(self):
+        a = self.acceleration
+        # Backward pass: every move must be able to slow down for the next,
+        # the last one stops
+        next_entry = 0.0
+        for move in reversed(self.queue):
+            move.exit_speed = next_entry
+            move.entry_speed = min(move.max_entry_speed, math.sqrt(next_entry ** 2 + 2 * a * move.length))
+            next_entry = move.entry_speed
+        # Forward pass: and reachable when speeding up from the one before,
+        # the first from the move already handed out
+        previous_exit = self.exit_speed
+        for move in self.queue:
+            move.entry_speed = min(move.entry_speed, previous_exit)
+            move.exit_speed = min(move.exit_speed, math.sqrt(move.entry_speed ** 2 + 2 * a * move.length))
+            previous_exit = move.exit_speed
@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+
+# Bounded hand-over between the planning thread (parse, plan, compile step
+# schedules) and the stepping thread (play them on the pins). The stepping
+# side only ever waits here when planning has fallen behind, which is counted
+# as an underrun together with the time spent waiting.
+DEFAULT_DEPTH = 64
+POLL_INTERVAL = 0.1 # s, how often a blocked planner checks for cancel
+
+END = object()
+
+
+class MotionQueue:
+    def __init__(self, depth=DEFAULT_DEPTH):
+        self.depth = depth
+        self.items = queue.Queue(depth)
+        self.cancelled = threading.Event()
+        self.puts = 0
+        self.gets = 0
+        self.full = 0           # planner found the queue full (it is ahead)
+        self.underruns = 0      # stepper found it empty mid job
+        self.starved = 0.0      # s the stepper spent waiting on the planner
+        self.depth_total = 0
+        self.depth_min = None
+        self.depth_max = 0
+
+    def put(self, item):
+        # False once the stepping side has given up, the planner should stop
+        try:
+            self.items.put_nowait(item)
+        except queue.Full:
+            self.full += 1
+            while True:
+                if self.cancelled.is_set():
+                    return False
+                try:
+                    self.items.put(item, timeout=POLL_INTERVAL)
+                    break
+                except queue.Full:
+                    pass
+        self.puts += 1
+        return True
+
+    def close(self):
+        # End of the job, the stepper stops after the last item
+        self.put(END)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def get(self):
+        depth = self.items.qsize()
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.depth_min = depth if self.depth_min is None else min(self.depth_min, depth)
+        try:
+            item = self.items.get_nowait()
+        except queue.Empty:
+            # The very first get waits for the job to start, not an underrun
+            if self.gets:
+                self.underruns += 1
+            start = time.perf_counter()
+            item = self.items.get()
+            if self.gets:
+                self.starved += time.perf_counter() - start
+        self.gets += 1
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is END:
+                return
+            yield item
+
+    def mean_depth(self):
+        return self.depth_total / self.gets if self.gets else 0.0
+
+    def report(self):
+        return (f"{self.gets - 1 if self.gets else 0} items, depth {self.depth}, "
+                f"queued min {self.depth_min or 0} / mean {self.mean_depth():.1f} / max {self.depth_max}, "
+                f"{self.underruns} underruns ({self.starved:.3f} s starved), planner blocked {self.full} times")
@@ -1,327 +1,58 @@
-import time
+import threading
 import os
-class BrailleGCodeGenerator:
-    def __init__(self):
-        # Define braille dimensions
-        self.BRAILLE = {
-            "marginWidth": 3,
-            "marginHeight": 5,
-            "paperWidth": 180,
-            "paperHeight": 260,
-            "letterWidth": 2.5,
-            "dotRadius": 1.2,
-            "letterPadding": 3.7,
-            "linePadding": 3,
-            "headDownPosition": -2.0,
-            "headUpPosition": 10,
-            "speed": 5000,
-            "delta": False,
-            "goToZero": True,
-            "invertX": True,
-            "invertY": True,
-            "mirrorX": False,
-            "mirrorY": True,
-            "language": "6 dots",
-            "GCODEup": 'M3 S1',
-            "GCODEdown": 'M3 S0',
-            "usedotgrid": False
-        }
-
-        # Define dot map for different languages
-        self.LANGUAGES = {
-            "6 dots": 
-                {
-                "latinToBraille": {
-                    "a": [1],
-		            "b": [1,2],
-		            "c": [1,4],
-		            "d": [1,4,5],
-		            "e": [1,5],
-		            "f": [1,2,4],
-		            "g": [1,2,4,5],
-		            "h": [1,2,5],
-		            "i": [2,4],
-		            "j": [2,4,5],
-		            "k": [1,3],
-		            "l": [1,2,3],
-		            "m": [1,3,4],
-		            "n": [1,3,4,5],
-		            "o": [1,3,5],
-		            "p": [1,2,3,4],
-		            "q": [1,2,3,4,5],
-		            "r": [1,2,3,5],
-		            "s": [2,3,4],
-		            "t": [2,3,4,5],
-		            "u": [1,3,6],
-		            "v": [1,2,3,6],
-		            "w": [2,4,5,6],
-		            "x": [1,3,4,6],
-		            "y": [1,3,4,5,6],
-		            "z": [1,3,5,6],
-		            " ": [],
-		            ".": [2,5,6],
-		            ",": [2],
-		            "?": [2,6],
-		            ";": [2,3],
-		            ":": [2,4],
-		            "!": [2,3,5],
-		            "(": [2,3,6],
-		            ")": [3,5,6],
-		            "'": [3],
-		            "-": [3,6],
-		            "/": [3,4],
-		            "*": [3,5],
-		            "+": [2,3,5],
-		            "=": [2,3,5,6],
-		            "0": [3, 4, 5, 6],
-		            "1": [1, 6],
-		            "2": [1, 2, 6],
-		            "3": [1, 4, 6],
-		            "4": [1, 4, 5, 6],
-		            "5": [1, 5, 6],
-		            "6": [1, 2, 4, 6],
-		            "7": [1, 2, 4, 5, 6],
-		            "8": [1, 2, 5, 6],
-		            "9": [2, 4, 6]
-                },
-                "dotMap": [[1, 2, 3], [4, 5, 6]],
-                "numberPrefix": [3, 4, 5, 6]
-            }
-        }
-
-        self.GCODEdotposition = []
-        self.GCODEsvgdotposition = []
-        self.xhead = 0
-        self.yhead = 0
-        self.generated_gcode = "" 
-
-    def replace_at(self, s, n, t):
-        return s[:n] + t + s[n+1:]
-
-    def dot_position(self, x, y):
-        return {"x": x, "y": y}
-
-    def gcode_set_absolute_positioning(self):
-        return "G90;\r\n"
-
-    def gcode_motor_off(self):
-        return "M84;\r\n"
-
-    def gcode_home(self):
-        return "G28 X;\r\n" + "G28 Y;\r\n"
-
-    def gcode_reset_position(self, X, Y):
-        return f"G92 X{X:.2f} Y{Y:.2f};\r\n"
-
-    def gcode_set_speed(self, speed):
-        return f"G1 F{speed};\r\n"
-
-    def gcode_position(self, X, Y):
-        code = ""
-        has_values = False
-        if X is not None:
-            code += f" X{X:.2f}"
-            has_values = True
-        if Y is not None:
-            code += f" Y{Y:.2f}"
-            has_values = True
-        if has_values:
-            code += ";\r\n"
-        return code
-
-    def gcode_go_to(self, X, Y):
-        return "G0" + self.gcode_position(X, Y)
-
-    def gcode_move_to(self, X, Y, Z=None):
-        code = "G1"
-        code += self.gcode_position(X, Y)
-        if Z is not None:
-            code += f" Z{Z:.2f}"
-        code += "\r"
-        return code
-
-    def gcode_move_to_cached(self, X=None, Y=None, comment=None):
-        if X is not None:
-            self.xhead = X
-        if Y is not None:
-            self.yhead = Y
-        if comment is not None:
-            code = f"G1 X{self.xhead:.2f} Y{self.yhead:.2f}; {comment}\r\n"
-        else:
-            code = f"G1 X{self.xhead:.2f} Y{self.yhead:.2f}\r\n"
-        return code
-
-    
-    def gcode_print_dot(self):
-        return f"{self.BRAILLE['GCODEdown']};\r\n{self.BRAILLE['GCODEup']};\r\n"
-
-    def gcode_print_dot_cached(self):
-        if self.xhead is not None and self.yhead is not None:
-            self.GCODEdotposition.append(self.dot_position(self.xhead, self.yhead))
-        return self.gcode_print_dot()
-
-    def gcode_sort_zigzag(self, positions):
-        sorted_positions = []
-        s = 0
-        e = 0
-        direction = 1
-
-        while e < len(positions):
-            while e < len(positions) and positions[s]["y"] == positions[e]["y"]:
-                e += 1
-
-            tmp = positions[s:e]
-            tmp.sort(key=lambda p: (p["y"], (p["x"] - p["x"]) * direction))
-            sorted_positions.extend(tmp)
-            direction *= -1
-            s = e
-
-        return sorted_positions
-
-    def build_optimized_gcode(self):
-        sorted_positions = self.gcode_sort_zigzag(self.GCODEdotposition)
-
-        code_str = self.gcode_home()
-        code_str += self.gcode_set_speed(self.BRAILLE["speed"])
-
-        if self.BRAILLE["goToZero"]:
-            code_str += self.gcode_move_to(0, 0)
-
-        for position in sorted_positions:
-            code_str += self.gcode_move_to_cached(position["x"], position["y"])
-            code_str += self.gcode_print_dot_cached()
-
-        code_str += self.gcode_move_to(0, 0)
-        code_str += self.gcode_motor_off()
-        return code_str
-
-    def braille_to_gcode(self, text):
-        self.GCODEdotposition = []
-        self.GCODEsvgdotposition = []
-        self.xhead = 0
-        self.yhead = 0
-
-        is_8dot = "8 dots" in self.BRAILLE["language"]
-        current_x = self.BRAILLE["marginWidth"]
-        current_y = self.BRAILLE["marginHeight"]
+import sys
+from braillegenerator import BrailleGenerator
+from glyphcache import axis_signs
+import metrics
+from metrics import log
+class BrailleGCodeGenerator(BrailleGenerator):
+    # Dots in machine coordinates for this embosser, see braillegenerator.py
+    def cell_origin(self, x, y):
+        paper_width = self.BRAILLE["paperWidth"]
+        paper_height = self.BRAILLE["paperHeight"]
+        gx = paper_width - x if self.BRAILLE["invertX"] else x
+        gy = -y
+
+        if self.BRAILLE["delta"]:
+            gx -= paper_width / 2
+            gy += paper_height / 2
+        elif not self.BRAILLE["invertY"]:
+            gy += paper_height
+
+        gx = self.BRAILLE["mirrorX"] and -gx or gx
+        gy = self.BRAILLE["mirrorY"] and -gy or gy
+        return gx, gy
+
+    def glyph_spacing(self):
+        # letterWidth apart both ways, signed like the cell origin
         letter_width = self.BRAILLE["letterWidth"]
-
-        gcode = self.gcode_set_absolute_positioning()
-        gcode += self.gcode_set_speed(self.BRAILLE["speed"])
-        if self.BRAILLE["goToZero"]:
-            gcode += self.gcode_move_to(0, 0, 0)
-        gcode += self.gcode_move_to(0, 0, self.BRAILLE["headUpPosition"])
-
-        is_writing_number = False
-        is_special_char = False
-        text_copy = list(text)
-
-        for i, char in enumerate(text_copy):
-            char_is_capital_letter = is_8dot and char.isupper()
-            char_is_line_break = char in ["\r", "\n"]
-
-            if char_is_line_break:
-                current_y += (2 if is_8dot else 3) * letter_width + self.BRAILLE["linePadding"]
-                current_x = self.BRAILLE["marginWidth"]
-
-                if current_y > self.BRAILLE["paperHeight"] - self.BRAILLE["marginHeight"]:
-                    break
-                continue
-
-            if char.lower() not in self.LANGUAGES[self.BRAILLE["language"]]["latinToBraille"]:
-                print(f"Character '{char}' was not translated in braille.")
-                continue
-
-            indices = self.LANGUAGES[self.BRAILLE["language"]]["latinToBraille"][char.lower()]
-
-            if not is_writing_number and char.isdigit():
-                indices = self.LANGUAGES[self.BRAILLE["language"]]["numberPrefix"]
-                text_copy[i] = char.lower()
-                is_writing_number = True
-            elif is_writing_number and char == " ":
-                is_writing_number = False
-            elif char_is_capital_letter:
-                indices = self.LANGUAGES[self.BRAILLE["language"]]["numberPrefix"]
-                text_copy[i] = char.lower()
-            elif not is_special_char and self.get_prefix_for_special_character(char):
-                indices = self.get_prefix_for_special_character(char)
-                text_copy[i] = char.lower()
-                is_special_char = True
-
-            gx = self.BRAILLE["paperWidth"] - current_x if self.BRAILLE["invertX"] else current_x
-            gy = -current_y
-
-            if self.BRAILLE["delta"]:
-                gx -= self.BRAILLE["paperWidth"] / 2
-                gy += self.BRAILLE["paperHeight"] / 2
-            elif not self.BRAILLE["invertY"]:
-                gy += self.BRAILLE["paperHeight"]
-
-            gcode += self.gcode_move_to_cached(self.BRAILLE["mirrorX"] and -gx or gx, self.BRAILLE["mirrorY"] and -gy or gy, None)
-
-            for y in range(4 if is_8dot else 3):
-                for x in range(2):
-                    if x + y * 2 + 1 in indices:
-                        # px = current_x + x * letter_width
-                        # py = current_y + y * letter_width
-                        # gx = self.BRAILLE["paperWidth"] - px if self.BRAILLE["invertX"] else px
-                        # gy = -py
-                        gx = self.BRAILLE["paperWidth"] - current_x if self.BRAILLE["invertX"] else current_x
-                        gy = -current_y
-
-                        if self.BRAILLE["delta"]:
-                            gx -= self.BRAILLE["paperWidth"] / 2
-                            gy += self.BRAILLE["paperHeight"] / 2
-                        elif not self.BRAILLE["invertY"]:
-                            gy += self.BRAILLE["paperHeight"]
-
-                        gcode += self.gcode_move_to_cached(self.BRAILLE["mirrorX"] and -gx or gx, self.BRAILLE["mirrorY"] and -gy or gy, None)
-                        gcode += self.gcode_print_dot_cached()
-
-            current_x += self.BRAILLE["letterWidth"] + self.BRAILLE["letterPadding"]
-
-            if current_x + self.BRAILLE["letterWidth"] + self.BRAILLE["dotRadius"] > self.BRAILLE["paperWidth"] - self.BRAILLE["marginWidth"]:
-                current_y += (2 if is_8dot else 3) * letter_width + self.BRAILLE["linePadding"]
-                current_x = self.BRAILLE["marginWidth"]
-
-            if current_y > self.BRAILLE["paperHeight"] - self.BRAILLE["marginHeight"]:
-                break
-
-        gcode += self.gcode_move_to(0, 0, self.BRAILLE["headUpPosition"])
-        if self.BRAILLE["goToZero"]:
-            gcode += self.gcode_move_to(0, 0, 0)
-
-        sorted_gcode = self.build_optimized_gcode()
-        return sorted_gcode
-
-    def get_prefix_for_special_character(self, char):
-        # Implement logic to get prefix for special characters
-        return []
-    def save_gcode_to_memory(self, gcode):
-        self.generated_gcode = gcode
-        
-    def save_gcode_to_file(self, gcode, directory):
-        filename = os.path.join(directory, "newcode.txt")
-        with open(filename, "w") as file:
-            file.write(gcode)
-        print("File saved succesfully")
-
-# Example usage
-generator = BrailleGCodeGenerator() 
-input_file_path = "voice_input.txt"
-with open(input_file_path, "r") as file:
-    text = file.read()
-gcode = generator.braille_to_gcode(text)
-directory = "/home/nappu"
-generator.save_gcode_to_memory(gcode)
-print(generator.generated_gcode)
-generator.save_gcode_to_file(gcode, directory)
+        return (letter_width, letter_width) + axis_signs(self.BRAILLE)
+
+# Example usage, through voice_input.txt. pipeline.py runs voice to braille
+# to motion in memory instead.
+def generate_from_voice_input():
+    generator = BrailleGCodeGenerator() 
+    input_file_path = "voice_input.txt"
+    with metrics.span("file_io"), open(input_file_path, "r") as file:
+        text = file.read()
+    gcode = generator.braille_to_gcode(text)
+    directory = "/home/nappu"
+    generator.save_gcode_to_memory(gcode)
+    log.debug("%s", generator.generated_gcode)
+    log.info("Path planning: %s", generator.path_planner.report())
+    generator.save_gcode_to_file(gcode, directory)
 
 
 #NOW THE BRAILLE GCODE FOR MOTOR########################################################
 
-import RPi.GPIO as GPIO
-import time
+from gpiobackend import HIGH, LOW, PigpioWaveBackend, SimulatedGPIOBackend, SimulatedPigpio, get_backend
+from motionplanner import Move, MotionPlanner
+from stepschedule import compile_move
+from gcodeparser import parse_line, parse_stream
+from motionqueue import MotionQueue
+from solenoid import SolenoidModel, SolenoidPhysics
+from jobformat import Job, command_records, gcode_to_records, plan_records
+from jobestimate import estimate_records
 
 # Constants
 
@@ -339,6 +70,15 @@ STEP_B = 23
 nENABLE_B = 24
 
 SOLENOID_PIN = 16
+# Embossing head fitted, see glyphcache.HEADS; SetupPins(head=...) changes
+# it. Only its pins are set up and strikes firing any other pin are refused,
+# so generate with the same BRAILLE["head"].
+HEAD = "single"
+# GPIO of each pin in head order (bit k of a strike mask fires HEAD_PINS[k],
+# see glyphcache.py), the first HEAD_SIZES[HEAD] of them are fitted. Pin 0
+# is the single pin head's.
+HEAD_PINS = [16, 5, 6, 12, 13, 19]
+HEAD_SIZES = {"single": 1, "column": 3, "cell": 6}
 
 x_step_pos = 0
 y_step_pos = 0
@@ -346,183 +86,382 @@ y_step_pos = 0
 X_MIN = 0
 X_MAX = 180
 
-# Pin setup
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR_A, GPIO.OUT)
-GPIO.setup(STEP_A, GPIO.OUT)
-GPIO.setup(nENABLE_A, GPIO.OUT)
-
-GPIO.setup(DIR_B, GPIO.OUT)
-GPIO.setup(STEP_B, GPIO.OUT)
-GPIO.setup(nENABLE_B, GPIO.OUT)
-
-GPIO.setup(SOLENOID_PIN, GPIO.OUT)
+# Motion planning, see motionplanner.py
+ACCELERATION = 500 # mm/s^2
+MAX_SPEED = 80 # mm/s
+JUNCTION_DEVIATION = 0.05 # mm
+motion = MotionPlanner(STEPSPERMM, ACCELERATION, MAX_SPEED, JUNCTION_DEVIATION)
+# Solenoid timing, see solenoid.py and CalibrateSolenoid
+actuator = SolenoidModel()
+# Planned actions the planning thread may run ahead of the stepper
+PIPELINE_DEPTH = 64
+# Set from another thread to stop PlayJob at the next record, the head
+# finishes the moves already planned
+abort = threading.Event()
+# Called instead of the console prompt at a page change when set, returns once
+# the next sheet is in (or abort is set), see jobdaemon.py
+page_change_handler = None
+
+# Pin backend, see gpiobackend.py. Nothing touches the pins until SetupPins
+# has been called, so the executor can be imported and run off the Pi.
+gpio = None
+
+def SetupPins(backend=None, head=None):
+    global gpio
+    global HEAD
+    if head is not None:
+        if head not in HEAD_SIZES:
+            raise ValueError(f"Unknown head '{head}', expected one of {tuple(HEAD_SIZES)}")
+        HEAD = head
+    gpio = backend if backend is not None else get_backend()
+    gpio.setup_output(DIR_A)
+    gpio.setup_output(STEP_A)
+    gpio.setup_output(nENABLE_A)
+
+    gpio.setup_output(DIR_B)
+    gpio.setup_output(STEP_B)
+    gpio.setup_output(nENABLE_B)
+
+    for pin in HeadPins():
+        gpio.setup_output(pin)
+    actuator.reset()
+    return gpio
+
+def SimulatedBackend(**options):
+    # Simulator wired up with this machine's step and solenoid pins
+    return SimulatedGPIOBackend(step_pins=(STEP_A, STEP_B), solenoid_pins=HEAD_PINS, **options)
+
+def SimulatedWaveBackend(**options):
+    # pigpio waveform playback against the simulator
+    return PigpioWaveBackend(SimulatedPigpio(step_pins=(STEP_A, STEP_B), solenoid_pins=HEAD_PINS, **options))
 
 
 def EnableMotors():
-    GPIO.output(nENABLE_A, GPIO.LOW)
-    GPIO.output(nENABLE_B, GPIO.LOW)
+    gpio.output(nENABLE_A, LOW)
+    gpio.output(nENABLE_B, LOW)
 
 def DisableMotors():
-    GPIO.output(nENABLE_A, GPIO.HIGH)
-    GPIO.output(nENABLE_B, GPIO.HIGH)
+    gpio.output(nENABLE_A, HIGH)
+    gpio.output(nENABLE_B, HIGH)
 
 # a = 0 move A, a = 1 move B
-def OneStep(a, direction):
+def OneStep(a, direction, delay=None):
+    delay = STEP_DELAY/1000.0 if delay is None else delay
     if a == 0:
-        GPIO.output(DIR_A, direction)
-        GPIO.output(STEP_A, GPIO.HIGH)
-        time.sleep(STEP_DELAY/1000.0)
-        GPIO.output(STEP_A, GPIO.LOW)
+        gpio.output(DIR_A, direction)
+        gpio.output(STEP_A, HIGH)
+        gpio.sleep(delay)
+        gpio.output(STEP_A, LOW)
     elif a == 1:
-        GPIO.output(DIR_B, direction)
-        GPIO.output(STEP_B, GPIO.HIGH)
-        time.sleep(STEP_DELAY/1000.0)
-        GPIO.output(STEP_B, GPIO.LOW)
+        gpio.output(DIR_B, direction)
+        gpio.output(STEP_B, HIGH)
+        gpio.sleep(delay)
+        gpio.output(STEP_B, LOW)
+
+def CompileMove(move):
+    # The whole move is compiled into a pulse schedule up front, see
+    # stepschedule.py. This is the expensive part and happens on the planning
+    # side; RunAction only plays it back.
+    job = metrics.job()
+    with job.span("step_compile"):
+        schedule = compile_move(move, STEP_A, STEP_B, DIR_A, DIR_B)
+    job.count("moves")
+    job.count("steps", abs(move.steps_a) + abs(move.steps_b))
+    job.count("travel_mm", move.length)
+    return ("move", schedule, move.end)
+
+def ExecuteMove(move):
+    RunAction(CompileMove(move))
+
+def QueueMove(x, y):
+    # Hands the move to the motion planner, which steps it once the moves
+    # after it are known (or FlushMotion is called)
+    x = max(X_MIN, min(X_MAX, x))
+    for move in motion.add(x, y):
+        ExecuteMove(move)
 
-# To move to (X, Y) we need to calculate dA = dX + dY and dB = dX - dY
-def MoveToPosition(x, y):
-    global x_step_pos
-    global y_step_pos
-    global X_MIN, X_MAX
+def FlushMotion():
+    # Brings the head to a standstill at the last queued position
+    for move in motion.flush():
+        ExecuteMove(move)
 
-    # Limit the X-coordinate to the defined range
-    x = max(X_MIN, min(X_MAX, x))
-    y = y/MMPERSTEP
-
-    x_steps_to_do = round(x) - x_step_pos
-    y_steps_to_do = round(y) - y_step_pos
-    a_steps_to_do = x_steps_to_do + y_steps_to_do
-    b_steps_to_do = x_steps_to_do - y_steps_to_do
-    x_step_pos = x
-    y_step_pos = y
-    # Decide on the direction based on the sign of x_steps_to_do
-    directionA = 0 if x_steps_to_do >= 0 else 1
-    directionB = 0 if x_steps_to_do >= 0 else 1
-
-    # after obtaining the direction we can convert to absolute values for simplicity
-    a_steps_to_do = abs(a_steps_to_do)
-    b_steps_to_do = abs(b_steps_to_do)
-    
-    # here we will store the error for the axis with sliced movement
-    if a_steps_to_do == b_steps_to_do:
-        for i in range(int(a_steps_to_do)):
-            OneStep(0, directionA)
-            OneStep(1, directionB)
-    else:
-        sliced_axis_error = 0
-        sliced_axis_increment = b_steps_to_do/a_steps_to_do if a_steps_to_do > b_steps_to_do else a_steps_to_do/b_steps_to_do
-
-        if a_steps_to_do > b_steps_to_do:
-            for i in range(int(a_steps_to_do)):
-                OneStep(0, directionA)
-                sliced_axis_error += sliced_axis_increment
-                if sliced_axis_error >= 1:
-                    OneStep(1, directionB)
-                    sliced_axis_error -= 1
-        elif a_steps_to_do < b_steps_to_do:
-            for i in range(int(b_steps_to_do)):
-                OneStep(1, directionB)
-                sliced_axis_error += sliced_axis_increment
-                if sliced_axis_error >= 1:
-                    OneStep(0, directionA)
-                    sliced_axis_error -= 1
+def MoveToPosition(x, y):
+    QueueMove(x, y)
+    FlushMotion()
 
 def StepsDelay():
-    time.sleep(STEP_DELAY/1000.0)
+    gpio.sleep(STEP_DELAY/1000.0)
+
+def WaitForPageChange():
+    # The generator parks the head at 0, 0 before the pause
+    if page_change_handler is not None:
+        page_change_handler()
+        return
+    input("Page finished. Insert the next sheet and press Enter to continue...")
 
 def SolenoidWrite(state):
     
     global solenoid_state
     solenoid_state = state
-    GPIO.output(SOLENOID_PIN,state)
-    print(state)   
-
-def ExecuteGcode(commands):
+    gpio.output(SOLENOID_PIN,state)
+
+def PlanGcode(command):
+    # Planning half of a command: updates the motion planner and yields the
+    # actions for RunAction. Nothing here touches the pins.
+    log.debug("%s", command)
+    yield from PlanRecords(command_records(command, list(motion.step_position), STEPSPERMM))
+
+def PlanRecords(records):
+    # Job records to actions, through the table the estimate uses as well
+    # (jobformat.plan_records)
+    for item in plan_records(records, motion, (X_MIN, X_MAX), STEPSPERMM):
+        yield CompileMove(item) if isinstance(item, Move) else item
+
+def PlanFlush():
+    for move in motion.flush():
+        yield CompileMove(move)
+
+def RunAction(action):
+    # Pin half of a command, see PlanGcode
     global x_step_pos
     global y_step_pos
-    global STEP_DELAY
-    print(commands)
-    if 'F' in commands:
-        STEP_DELAY = int(5000 - 5*int(commands['F']))
-        if STEP_DELAY <0.9: STEP_DELAY = 0.9
-        print("New step delay: " + str(STEP_DELAY))
-        
-    if 'M' in commands:  # Check for M3 command
-        if int(commands['M']) == 3:
-            if 'S' in commands:  # Check for S parameter
-                if int(commands['S']) == 1 :  # If S parameter is 1, turn on solenoid
-                    SolenoidWrite(1)
-                    print("Solenoid turned on")
-                    time.sleep(0.9)
-                elif int(commands['S']) == 0:  # If S parameter is 0, turn off solenoid
-                    SolenoidWrite(0)
-                    print("Solenoid turned off")
-                    time.sleep(0.9)
-        if int(commands['M']) == 84:  # If M command is M84
-            DisableMotors()  # Turn off the motors
-            motors_enabled = False  # Update motor state variable
-            print("Motors turned off")
-            return  # Exit the function after handling M84
-    if 'X' in commands or 'Y' in commands:
-        MoveToPosition(float(commands['X']) if 'X' in commands else x_step_pos * MMPERSTEP, float(commands['Y']) if 'Y' in commands else y_step_pos * MMPERSTEP)
-    if 'G' in commands:
-        if commands['G'] == '28':
-            x_step_pos = 0
-            y_step_pos = 0
-        elif commands['G'] == '29':
-            # Emboss the Braille character
-            for i in range(10):
-                # Turn on the solenoid
-                SolenoidWrite(1)
-                print("Solenoid turned on")
-                time.sleep(0.1)
-                # Turn off the solenoid
-                SolenoidWrite(0)
-                print("Solenoid turned off")
-                time.sleep(0.1)
-    # if 'M' in commands:  # Check for M commands
-    #     if int(commands['M']) == 84:  # If M command is M84
-    #         DisableMotors()  # Turn off the motors
-    #         motors_enabled = False  # Update motor state variable
-    #         print("Motors turned off")
-    #         return  # Exit the function after handling M84
+    kind = action[0]
+    if kind == "move":
+        gpio.play_schedule(action[1])
+        x_step_pos = round(action[2][0] * STEPSPERMM)
+        y_step_pos = round(action[2][1] * STEPSPERMM)
+    elif kind == "strike":
+        Strike(action[1])
+    elif kind == "solenoid":
+        # Plain writes are timed by the model unless the action says otherwise
+        down = action[1] == actuator.active
+        if action[2] is not None:
+            SolenoidWrite(action[1])
+            log.debug("Solenoid turned %s", "on" if action[1] else "off")
+            gpio.sleep(action[2])
+        elif down:
+            actuator.fire(gpio)
+            SolenoidWrite(action[1])
+            log.debug("Solenoid turned %s", "on" if action[1] else "off")
+            gpio.sleep(actuator.pulse_on)
+        else:
+            SolenoidWrite(action[1])
+            log.debug("Solenoid turned %s", "on" if action[1] else "off")
+            actuator.wait_until(gpio, actuator.release(gpio))
+    elif kind == "page":
+        WaitForPageChange()
+    elif kind == "motors_off":
+        DisableMotors()  # Turn off the motors
+        log.info("Motors turned off")
+    elif kind == "home":
+        x_step_pos = 0
+        y_step_pos = 0
+
+def HeadPins():
+    # GPIO of the fitted head's pins
+    return HEAD_PINS[:HEAD_SIZES[HEAD]]
+
+def HeadMask(mask):
+    # Strike mask (bit k = head pin k) to a GPIO bitmask
+    head_pins = HeadPins()
+    if mask >> len(head_pins):
+        raise ValueError(f"Strike mask {mask:b} fires pins the {HEAD} head does not have")
+    pins = 0
+    for k, pin in enumerate(head_pins):
+        if mask >> k & 1:
+            pins |= 1 << pin
+    return pins
+
+def Strike(mask=0):
+    # One dot, or with a mask the selected pins of a multi-pin head together:
+    # fire, hold and release as set in the solenoid model. Returns once the
+    # pins are off the paper, the rest of the retract runs while the head
+    # travels on (solenoid.py).
+    actuator.fire(gpio)
+    metrics.count("struck", bin(mask).count("1") if mask else 1)
+    if not mask:
+        log.debug("Solenoid struck")
+        SolenoidWrite(actuator.level(True))
+        gpio.sleep(actuator.pulse_on)
+        SolenoidWrite(actuator.level(False))
+    else:
+        pins = HeadMask(mask)
+        gpio.output_mask(pins, actuator.level(True))
+        log.debug("Pins %s fired", format(mask, "b"))
+        gpio.sleep(actuator.pulse_on)
+        gpio.output_mask(pins, actuator.level(False))
+    actuator.wait_until(gpio, actuator.release(gpio))
+
+def ExecuteGcode(command):
+    # command is a gcodeparser.GcodeCommand, planned and run straight away
+    for action in PlanGcode(command):
+        RunAction(action)
 
 def ProcessGcodeString(gcode_string):
-    lines = gcode_string.split('\n')
-    for line in lines:
-        line = line.strip('\n\r')
-        line = line.split(';', 1)[0]
-        if len(line) > 0:
-            gcode = line.split(' ')
-            commands = {}
-            for command in gcode:
-                # print("command= ", command)
-                if command[0] == 'X' and command[1:]:
-                    commands['X'] = float(command[1:])
-                elif command[0] == 'Y' and command[1:]:
-                    commands['Y'] = float(command[1:])
-                elif command[0] == 'Z' and command[1:]:
-                    commands['Z'] = float(command[1:])
-                elif command[0] == 'S' and command[1:]:
-                    commands['S'] = float(command[1:])
-                elif command[0] == 'G' and command[1:]:
-                    commands['G'] = float(command[1:])
-                elif command[0] == 'M' and command[1:]:  # Check for 'M' command
-                     commands['M'] = float(command[1:])
-            ExecuteGcode(commands)
+    # Accepts the whole program as one string, an open file or any iterable
+    # of G-code text (generator.braille_to_gcode_iter(text) ...), so motion
+    # can start before the rest of the program exists
+    with metrics.span("execution"):
+        for command in parse_stream(gcode_string):
+            ExecuteGcode(command)
+        FlushMotion()
+
+def ProcessGcodeLine(line):
+    command = parse_line(line)
+    if command is not None:
+        ExecuteGcode(command)
+
+def PlanningThread(gcode_source, actions, errors):
+    # Parses, plans and compiles ahead of the stepper into the bounded queue.
+    # Time blocked on a full queue is counted in the span as well.
+    try:
+        with metrics.span("motion_planning"):
+            for command in parse_stream(gcode_source):
+                for action in PlanGcode(command):
+                    if not actions.put(action):
+                        return
+            for action in PlanFlush():
+                if not actions.put(action):
+                    return
+    except BaseException as error:
+        errors.append(error)
+    finally:
+        actions.close()
+
+def SteppingThread(actions, errors):
+    # Only plays what the planner has ready
+    try:
+        for action in actions:
+            RunAction(action)
+    except BaseException as error:
+        errors.append(error)
+        actions.cancel()
+
+def ProcessGcodePipelined(gcode_source, depth=PIPELINE_DEPTH):
+    # Same as ProcessGcodeString, but parsing and planning run on their own
+    # thread so the motors never wait for Python to read the next line.
+    # Returns the MotionQueue with the depth and underrun counters.
+    actions = MotionQueue(depth)
+    errors = []
+    planner = threading.Thread(target=PlanningThread, args=(gcode_source, actions, errors), name="planner", daemon=True)
+    stepper = threading.Thread(target=SteppingThread, args=(actions, errors), name="stepper", daemon=True)
+    with metrics.span("execution"):
+        planner.start()
+        stepper.start()
+        stepper.join()
+        actions.cancel()
+        planner.join()
+    job = metrics.job()
+    job.count("queue_underruns", actions.underruns)
+    job.count("queue_starved_s", actions.starved)
+    job.count("queue_planner_blocked", actions.full)
+    job.set("queue_mean_depth", actions.mean_depth())
+    if errors:
+        raise errors[0]
+    log.info("Motion queue: %s", actions.report())
+    return actions
+
+def ProcessJob(job, estimate=None):
+    # Plays a compiled job (a path, bytes or jobformat.Job). Records already
+    # hold steps, so nothing is parsed between the file and the pins.
+    # estimate: the caller's EstimateJob(job), only logged here
+    if not isinstance(job, Job):
+        job = Job.open(job) if isinstance(job, (str, os.PathLike)) else Job(job)
+    if job.steps_per_mm != STEPSPERMM:
+        raise ValueError(f"Job was compiled for {job.steps_per_mm} steps/mm, machine has {STEPSPERMM}")
+    if estimate is not None:
+        log.info("Estimate: %s", estimate.report())
+    with metrics.span("execution"):
+        PlayJob(job)
+
+def PlayJob(job):
+    # Records of a checked job, see ProcessJob
+    for action in PlanRecords(job):
+        if abort.is_set():
+            log.warning("Job aborted")
+            break
+        RunAction(action)
+    FlushMotion()
+
+def EstimateJob(source):
+    # Time, dots and travel of G-code (string, open file) or a Job on this
+    # machine's motion settings and solenoid timing, without stepping
+    records = source if isinstance(source, Job) else gcode_to_records(source, STEPSPERMM)
+    planner = MotionPlanner(STEPSPERMM, ACCELERATION, MAX_SPEED, JUNCTION_DEVIATION)
+    return estimate_records(records, planner, actuator, (X_MIN, X_MAX), STEPSPERMM)
+
+def SimulateStrikes(model, gcode, physics):
+    # Runs gcode on a fresh simulator with the given solenoid model and
+    # checks every strike against the simulated mechanics
+    global actuator
+    actuator = model
+    backend = SetupPins(SimulatedBackend())
+    motion.set_position(0, 0)
+    ProcessGcodeString(gcode)
+    return physics.evaluate(backend.edges(), SOLENOID_PIN, (STEP_A, STEP_B), model.active)
+
+def CalibrateSolenoid(physics=None, dots=60, resolution=0.001, margin=1.25):
+    # Shortest pulse_on, clearance, settle and min_refire that still emboss a test line
+    # cleanly on the simulator, each found by bisection, plus a safety margin.
+    # physics holds the measured mechanics of the solenoid (see solenoid.py).
+    # Every fourth dot is struck twice so min_refire is exercised.
+    global actuator
+    global gpio
+    physics = physics if physics is not None else SolenoidPhysics()
+    test = ""
+    for i in range(dots):
+        test += f"G1 X{2.5 * (i % 20):.2f} Y{6.0 * (i // 20):.2f}\nM3 S2\n"
+        if i % 4 == 0:
+            test += "M3 S2\n"
+    saved = (actuator, gpio, metrics.job())
+    metrics.new_job("solenoid-calibration")
+    values = {"pulse_on": 0.5, "clearance": 0.5, "settle": 0.5, "min_refire": 1.0}
+    try:
+        if not SimulateStrikes(SolenoidModel(**values), test, physics)["reliable"]:
+            raise ValueError("Solenoid does not strike reliably even with the slowest timings")
+        for name in values:
+            low, high = 0.0, values[name]
+            while high - low > resolution:
+                middle = (low + high) / 2
+                trial = dict(values, **{name: middle})
+                if SimulateStrikes(SolenoidModel(**trial), test, physics)["reliable"]:
+                    high = middle
+                else:
+                    low = middle
+            values[name] = high
+        model = SolenoidModel(**{name: value * margin for name, value in values.items()})
+        result = SimulateStrikes(model, test, physics)
+    finally:
+        actuator, gpio, metrics.current = saved
+    log.info("Calibrated %s, %.3f s per dot on the solenoid (%.3f s struck in place), %d test dots, reliable: %s",
+             model, *model.strike_time(), result["dots"], result["reliable"])
+    return model
 
 def read_gcode_from_file(file_path):
     with open(file_path, 'r') as file:
         gcode_string = file.read()
     return gcode_string
 
-def main():
+def main(gcode_file_path="newcode.txt"):
+    # Runs a G-code file, or a compiled job (.ebj, see jobformat.py)
+    SetupPins()
     EnableMotors()
-    # Assuming generator.generated_gcode contains the G-code string
-    gcode_file_path = "newcode.txt"  # Replace with the actual file path
-    gcode_string = read_gcode_from_file(gcode_file_path)
-    ProcessGcodeString(gcode_string)
+    if gcode_file_path.endswith(".ebj"):
+        job = Job.open(gcode_file_path)
+        ProcessJob(job, EstimateJob(job))
+    else:
+        with open(gcode_file_path, 'r') as file:
+            log.info("Estimate: %s", EstimateJob(file).report())
+            file.seek(0)
+            ProcessGcodePipelined(file)
+    metrics.dump_job()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    metrics.configure_logging()
+    # python newbrailecombine1.py [file.gcode|file.ebj], without a file the
+    # voice input is translated first
+    if len(sys.argv) > 1:
+        main(sys.argv[1])
+    else:
+        generate_from_voice_input()
+        main()
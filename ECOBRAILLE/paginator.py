@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from gcodeemitter import GcodeEmitter
+from pathplanner import PathPlanner
+
+# Splits a document into pages that can be turned into G-code independently.
+# Each page remembers where it starts in the text and the number / special
+# character mode carried over from the page before, so any page can be
+# generated on its own, in any order, while earlier pages are embossing.
+
+
+class Page:
+    def __init__(self, index, start, end, is_writing_number=False, is_special_char=False):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.is_writing_number = is_writing_number
+        self.is_special_char = is_special_char
+        self.dots = 0
+
+    def __repr__(self):
+        return f"Page({self.index}, chars {self.start}:{self.end}, {self.dots} dots)"
+
+
+def paginate(generator, text):
+    # One layout pass, no path planning or G-code: cheap enough to run up
+    # front to get the page count and dots per page
+    starts = []
+    dots_per_page = {}
+    for page, dots in generator.iter_dot_lines([text], page_starts=starts):
+        dots_per_page[page] = dots_per_page.get(page, 0) + dots.unique().dot_count()
+
+    boundaries = [(0, False, False)] + starts
+    pages = []
+    for index, (start, is_writing_number, is_special_char) in enumerate(boundaries):
+        if start >= len(text) and index > 0:
+            break
+        end = boundaries[index + 1][0] if index + 1 < len(boundaries) else len(text)
+        page = Page(index, start, end, is_writing_number, is_special_char)
+        page.dots = dots_per_page.get(index, 0)
+        pages.append(page)
+    return pages
+
+
+def page_gcode_iter(generator, text, page):
+    # G-code for the dots of a single page, without program start/end
+    planner = PathPlanner(generator.BRAILLE["pathPlanning"])
+    chunk = [text[page.start:page.end]]
+    for _, dots in generator.iter_dot_lines(chunk, page.is_writing_number, page.is_special_char):
+        yield from generator.gcode_dots(dots, planner)
+
+
+def page_gcode(generator, text, page, sink=None):
+    out = GcodeEmitter(sink)
+    out.writelines(page_gcode_iter(generator, text, page))
+    return out.getvalue()
+
+
+def paginated_gcode_iter(generator, text, pages=None, lookahead=1):
+    # Whole program, one page string at a time. Up to `lookahead` pages after
+    # the one being consumed are generated in a background thread, so the
+    # next page is ready by the time the embosser has finished this one.
+    if pages is None:
+        pages = paginate(generator, text)
+    yield generator.gcode_program_start()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = [pool.submit(page_gcode, generator, text, page) for page in pages[:lookahead + 1]]
+        for page in pages:
+            if page.index > 0:
+                yield generator.gcode_page_change(page.index)
+            code = pending.pop(0).result()
+            next_index = page.index + lookahead + 1
+            if next_index < len(pages):
+                pending.append(pool.submit(page_gcode, generator, text, pages[next_index]))
+            yield code
+    yield generator.gcode_program_end()
+
+
+# Per process copy of the generator used by render_page, keyed by class and
+# settings so a worker only compiles the glyph table once
+_worker_generators = {}
+
+
+def render_page(job):
+    # Runs in a worker process. Only the settings and the page's own text are
+    # sent over, never the generator instance or the whole document.
+    generator_class, braille, languages, page_text, is_writing_number, is_special_char = job
+    key = (generator_class, repr(braille))
+    generator = _worker_generators.get(key)
+    if generator is None:
+        generator = generator_class()
+        generator.BRAILLE = braille
+        generator.LANGUAGES = languages
+        _worker_generators.clear()
+        _worker_generators[key] = generator
+    page = Page(0, 0, len(page_text), is_writing_number, is_special_char)
+    return page_gcode(generator, page_text, page)
+
+
+def generate_pages_parallel(generator, text, workers=None, sink=None, pages=None):
+    # Translates and path-plans pages in a process pool and writes them back
+    # in page order, with the usual page change sequence in between
+    if pages is None:
+        pages = paginate(generator, text)
+    jobs = [(type(generator), generator.BRAILLE, generator.LANGUAGES,
+             text[page.start:page.end], page.is_writing_number, page.is_special_char)
+            for page in pages]
+
+    out = GcodeEmitter(sink)
+    out.write(generator.gcode_program_start())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for page, code in zip(pages, pool.map(render_page, jobs)):
+            if page.index > 0:
+                out.write(generator.gcode_page_change(page.index))
+            out.write(code)
+    out.write(generator.gcode_program_end())
+    return out.getvalue()
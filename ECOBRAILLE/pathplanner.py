@@ -0,0 +1,165 @@
+import math
+
+from dotstore import SCALE
+
+# Orders the dots of a line or page so the head travels as little as possible.
+#   "zigzag"  - boustrophedon: rows of equal y run in alternating directions,
+#               or columns of equal x when that is shorter (within a line of
+#               braille cells the three dot rows are wider than they are tall)
+#   "nearest" - zigzag order refined by a greedy nearest-neighbour walk
+#   "2opt"    - nearest-neighbour walk improved with 2-opt segment reversals
+# Plans work on a DotStore (fixed-point hundredths of a mm) and on lists of
+# indices into it, positions are never copied into per-dot objects.
+MODES = ("zigzag", "nearest", "2opt")
+# Dots closer than this (fixed-point units) are treated as one row or column
+ROW_TOLERANCE = 1
+TWO_OPT_MAX_PASSES = 4
+
+
+def travel_distance(store, order=None, start=None):
+    # Fixed-point length of the path through the dots in the given order
+    xs, ys = store.xs, store.ys
+    if order is None:
+        order = range(len(xs))
+    total = 0
+    if start is not None:
+        px, py = start
+    else:
+        px = py = None
+    for i in order:
+        x, y = xs[i], ys[i]
+        if px is not None:
+            total += math.hypot(x - px, y - py)
+        px, py = x, y
+    return total
+
+
+def group_rows(store, axis="y"):
+    primary = store.ys if axis == "y" else store.xs
+    rows = []
+    for i in store.sorted_indices(axis):
+        if rows and primary[i] - primary[rows[-1][0]] <= ROW_TOLERANCE:
+            rows[-1].append(i)
+        else:
+            rows.append([i])
+    return rows
+
+
+def serpentine(store, start=None, axis="y"):
+    # Each row is run from the end nearest to where the previous one finished,
+    # so the head reverses direction on every row instead of flying back to
+    # the margin
+    across = store.xs if axis == "y" else store.ys
+    current = None if start is None else (start[0] if axis == "y" else start[1])
+    order = []
+    for row in group_rows(store, axis):
+        if current is not None and abs(current - across[row[-1]]) < abs(current - across[row[0]]):
+            row.reverse()
+        order.extend(row)
+        current = across[row[-1]]
+    return order
+
+
+def boustrophedon(store, start=None):
+    by_rows = serpentine(store, start, "y")
+    by_columns = serpentine(store, start, "x")
+    if travel_distance(store, by_columns, start) < travel_distance(store, by_rows, start):
+        return by_columns
+    return by_rows
+
+
+def nearest_neighbour(store, order, start):
+    xs, ys = store.xs, store.ys
+    remaining = list(order)
+    result = []
+    cx, cy = start
+    while remaining:
+        best = min(range(len(remaining)), key=lambda k: (xs[remaining[k]] - cx) ** 2 + (ys[remaining[k]] - cy) ** 2)
+        i = remaining[best]
+        remaining[best] = remaining[-1]
+        remaining.pop()
+        result.append(i)
+        cx, cy = xs[i], ys[i]
+    return result
+
+
+def two_opt(store, order, start, max_passes=TWO_OPT_MAX_PASSES):
+    # Open path with a fixed start (the head position) and a free end
+    xs = [start[0]] + [store.xs[i] for i in order]
+    ys = [start[1]] + [store.ys[i] for i in order]
+    route = [-1] + list(order)
+    n = len(route)
+
+    def distance(a, b):
+        return math.hypot(xs[a] - xs[b], ys[a] - ys[b])
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            d_ab = distance(i - 1, i)
+            for j in range(i + 1, n):
+                if j + 1 < n:
+                    delta = distance(i - 1, j) + distance(i, j + 1) - d_ab - distance(j, j + 1)
+                else:
+                    delta = distance(i - 1, j) - d_ab
+                if delta < -1e-6:
+                    route[i:j + 1] = route[j:i - 1:-1]
+                    xs[i:j + 1] = xs[j:i - 1:-1]
+                    ys[i:j + 1] = ys[j:i - 1:-1]
+                    d_ab = distance(i - 1, i)
+                    improved = True
+        if not improved:
+            break
+    return route[1:]
+
+
+class PathPlanner:
+    def __init__(self, mode="zigzag"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown path planning mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.reset()
+
+    def reset(self, x=0, y=0):
+        self.set_head(x, y)
+        self.travel_before = 0
+        self.travel_after = 0
+        self.dots = 0
+
+    def set_head(self, x=0, y=0):
+        # The head was moved between two plans, e.g. parked for a page change
+        self.head = (int(round(x * SCALE)), int(round(y * SCALE)))
+        self.unplanned_head = self.head
+
+    def plan(self, store):
+        # Can be called once per line or page, the head position carries over so
+        # consecutive calls form one continuous path. Returns a new DotStore.
+        if not store:
+            return store
+        self.travel_before += travel_distance(store, None, self.unplanned_head)
+        self.unplanned_head = store[len(store) - 1]
+
+        # A position struck twice gains nothing
+        store = store.unique()
+        order = boustrophedon(store, self.head)
+        travel = travel_distance(store, order, self.head)
+        if self.mode != "zigzag":
+            refined = nearest_neighbour(store, order, self.head)
+            if self.mode == "2opt":
+                refined = two_opt(store, refined, self.head)
+            # Greedy walks can lose to the plain zigzag on regular grids
+            refined_travel = travel_distance(store, refined, self.head)
+            if refined_travel < travel:
+                order, travel = refined, refined_travel
+
+        self.travel_after += travel
+        self.dots += len(order)
+        self.head = store[order[-1]]
+        return store.take(order)
+
+    def report(self):
+        before = self.travel_before / SCALE
+        after = self.travel_after / SCALE
+        percent = 100 * (before - after) / before if before else 0
+        return (f"{self.dots} dots, travel {before:.1f} mm -> "
+                f"{after:.1f} mm ({self.mode}, {percent:.1f}% saved)")
@@ -0,0 +1,93 @@
+import os
+import queue
+import threading
+import time
+
+import metrics
+from metrics import log
+import newbrailecombine1 as embosser
+from jobformat import Job
+from VoiceInput import VoiceService
+
+# Voice to braille to motion in one process. Dictation runs on its own thread
+# and hands the recognized text over an in-memory queue; each text is
+# compiled straight to a binary job (jobformat.py) and played by the executor
+# while the next utterances are already being recognized. Nothing goes
+# through voice_input.txt / newcode.txt: set audit_dir or ECOBRAILLE_AUDIT to
+# keep a copy of every text and its G-code.
+DONE = None
+
+
+def DictationThread(service, texts):
+    try:
+        for dictated in service.utterances():
+            texts.put((dictated.text, time.perf_counter()))
+    except BaseException:
+        log.exception("Dictation failed")
+    finally:
+        texts.put(DONE)
+
+
+def WriteAudit(audit_dir, number, text, job):
+    stem = os.path.join(audit_dir, time.strftime(f"%Y%m%d-%H%M%S-{number}"))
+    with metrics.span("file_io"):
+        with open(stem + "-voice_input.txt", "w") as file:
+            file.write(text)
+        with open(stem + "-newcode.txt", "w") as file:
+            file.write(job.to_gcode())
+    log.info("Audit copy saved to %s-*", stem)
+
+
+def Emboss(generator, text, service=None, audit_dir=None, number=1):
+    # One recognized text from translation to the last dot
+    job = Job(generator.braille_to_job(text))
+    if audit_dir:
+        WriteAudit(audit_dir, number, text, job)
+    estimate = embosser.EstimateJob(job)
+    if service is not None:
+        pages = len(estimate.pages)
+        minutes = max(1, round(estimate.total_seconds / 60))
+        pages = f"{pages} page" + ("s" if pages > 1 else "")
+        minutes = f"{minutes} minute" + ("s" if minutes > 1 else "")
+        service.say(f"Embossing {pages}, about {minutes}", key="progress")
+    # Every program ends with the motors off
+    embosser.EnableMotors()
+    embosser.ProcessJob(job, estimate)
+    metrics.count("documents")
+    if service is not None:
+        service.say("Embossing finished", key="progress")
+
+
+def RunPipeline(service=None, generator=None, backend=None, audit_dir=None):
+    # Runs until dictation ends (or Ctrl-C)
+    audit_dir = audit_dir or os.environ.get("ECOBRAILLE_AUDIT")
+    if audit_dir:
+        os.makedirs(audit_dir, exist_ok=True)
+    service = service or VoiceService()
+    generator = generator or embosser.BrailleGCodeGenerator()
+    embosser.SetupPins(backend)
+    texts = queue.Queue()
+    dictation = threading.Thread(target=DictationThread, args=(service, texts), name="dictation", daemon=True)
+    dictation.start()
+    number = 0
+    try:
+        while True:
+            item = texts.get()
+            if item is DONE:
+                break
+            text, recognized_at = item
+            number += 1
+            metrics.job().add_time("text_to_motion_wait", time.perf_counter() - recognized_at)
+            Emboss(generator, text, service, audit_dir, number)
+    except KeyboardInterrupt:
+        log.info("Pipeline stopped")
+    finally:
+        service.stop()
+        embosser.DisableMotors()
+        service.close()
+    metrics.dump_job()
+
+
+if __name__ == "__main__":
+    metrics.configure_logging()
+    RunPipeline()
@@ -0,0 +1,173 @@
+import json
+import os
+import time
+from collections import namedtuple
+
+import speech_recognition as sr
+
+import metrics
+from metrics import log
+
+# Speech recognisers for VoiceInput. All expose recognize(audio), taking an
+# sr.AudioData and returning the text, or raising sr.UnknownValueError when
+# nothing was understood (sr.RequestError when the engine itself failed).
+#   VoskRecognizer    - offline, Kaldi model loaded once and kept resident
+#   SphinxRecognizer  - offline, PocketSphinx decoder kept resident
+#   GoogleRecognizer  - the Google web API, needs the network
+#   FileRecognizer    - fake for tests: utterances come from audio files and
+#                       the text from a transcript next to each file
+# Pick one with ECOBRAILLE_RECOGNIZER=vosk|sphinx|google|file, by default the
+# first offline engine that loads is used and Google only when none does.
+# The Vosk model directory is ECOBRAILLE_VOSK_MODEL (default "model" next to
+# this file), the fake's files ECOBRAILLE_AUDIO (a directory or paths
+# separated by os.pathsep).
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+VOSK_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+AUDIO_EXTENSIONS = (".wav", ".aif", ".aiff", ".flac")
+Utterance = namedtuple("Utterance", "text audio_seconds latency")
+
+
+class VoskRecognizer:
+    name = "vosk"
+
+    def __init__(self, model_path=None):
+        from vosk import KaldiRecognizer, Model, SetLogLevel
+        model_path = model_path or os.environ.get("ECOBRAILLE_VOSK_MODEL", VOSK_MODEL)
+        if not os.path.isdir(model_path):
+            raise OSError(f"No Vosk model in {model_path}")
+        SetLogLevel(-1)
+        with metrics.span("model_load"):
+            self.model = Model(model_path)
+            self.recognizer = KaldiRecognizer(self.model, SAMPLE_RATE)
+
+    def recognize(self, audio):
+        # FinalResult also resets the recognizer for the next utterance
+        self.recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH))
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class SphinxRecognizer:
+    name = "sphinx"
+
+    def __init__(self):
+        # recognize_sphinx in speech_recognition loads the model on every
+        # call, the decoder here is loaded once
+        from pocketsphinx import Decoder
+        with metrics.span("model_load"):
+            self.decoder = Decoder(samprate=SAMPLE_RATE)
+
+    def recognize(self, audio):
+        self.decoder.start_utt()
+        self.decoder.process_raw(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH),
+                                 full_utt=True)
+        self.decoder.end_utt()
+        hypothesis = self.decoder.hyp()
+        if hypothesis is None or not hypothesis.hypstr:
+            raise sr.UnknownValueError()
+        return hypothesis.hypstr
+
+
+class GoogleRecognizer:
+    name = "google"
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_google(audio)
+
+
+class FileRecognizer:
+    # Plays back recorded utterances: listen() returns the next file as
+    # AudioData and recognize() the text of its transcript (clip.wav ->
+    # clip.txt). real_time_factor makes recognition take that fraction of
+    # the audio length, as a real engine would.
+    name = "file"
+
+    def __init__(self, paths=None, real_time_factor=0.0):
+        paths = paths or os.environ.get("ECOBRAILLE_AUDIO", "")
+        if isinstance(paths, str):
+            paths = audio_files(paths)
+        self.paths = list(paths)
+        self.real_time_factor = real_time_factor
+        self.transcripts = {}
+        self.index = 0
+
+    def adjust_for_ambient_noise(self, source=None, duration=1):
+        pass
+
+    def listen(self, source=None, timeout=None, phrase_time_limit=None):
+        # Same arguments as sr.Recognizer.listen; raises EOFError once all
+        # files are played
+        if self.index == len(self.paths):
+            raise EOFError("No more audio files")
+        path = self.paths[self.index]
+        self.index += 1
+        with sr.AudioFile(path) as file:
+            audio = sr.Recognizer().record(file)
+        transcript = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(transcript):
+            with open(transcript) as text:
+                self.transcripts[audio.frame_data] = text.read().strip()
+        return audio
+
+    def recognize(self, audio):
+        time.sleep(self.real_time_factor * audio_seconds(audio))
+        text = self.transcripts.get(audio.frame_data)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+def audio_files(paths):
+    # A directory (its audio files in name order) or paths separated by os.pathsep
+    if os.path.isdir(paths):
+        return [os.path.join(paths, name) for name in sorted(os.listdir(paths))
+                if name.lower().endswith(AUDIO_EXTENSIONS)]
+    return [path for path in paths.split(os.pathsep) if path]
+
+
+def get_recognizer(name=None):
+    name = name or os.environ.get("ECOBRAILLE_RECOGNIZER")
+    if name == "vosk":
+        return VoskRecognizer()
+    if name == "sphinx":
+        return SphinxRecognizer()
+    if name == "google":
+        return GoogleRecognizer()
+    if name == "file":
+        return FileRecognizer()
+    for engine in (VoskRecognizer, SphinxRecognizer):
+        try:
+            return engine()
+        except (ImportError, OSError) as error:
+            log.debug("%s recognizer not available: %s", engine.name, error)
+    log.warning("No offline speech recognizer is available, using Google (needs the network)")
+    return GoogleRecognizer()
+
+
+def audio_seconds(audio):
+    return len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+
+
+def transcribe(engine, audio):
+    # Text of one utterance. Logs how long recognition took and the real-time
+    # factor (recognition time / audio length, below 1 keeps up with speech);
+    # both go into the job as the recognition span and audio_seconds.
+    job = metrics.job()
+    start = time.perf_counter()
+    try:
+        text = engine.recognize(audio)
+    finally:
+        latency = time.perf_counter() - start
+        job.add_time("recognition", latency)
+    seconds = audio_seconds(audio)
+    job.count("utterances")
+    job.count("audio_seconds", seconds)
+    log.info("%s recognized %.1f s of audio in %.3f s (real-time factor %.2f)", engine.name, seconds, latency,
+             latency / seconds if seconds else 0.0)
+    return Utterance(text, seconds, latency)
@@ -0,0 +1,138 @@
+import random
+
+from gpiobackend import HIGH, LOW
+
+# Timing of the embossing solenoid. The relay is active low: driving the pin
+# LOW fires the pin into the paper, HIGH releases it.
+#   pulse_on    how long the coil stays energised for one dot
+#   clearance   wait after release until the pin is off the paper, the head
+#               may move from then on while the pin is still retracting
+#   settle      wait after release until the pin is fully retracted, the
+#               earliest it may fire again
+#   min_refire  shortest time from one fire to the next (coil and spring)
+# Waits are deadlines on the backend clock, so a move started after the
+# clearance counts towards settle and min_refire: travel to the next dot
+# overlaps the retract instead of following it.
+# The defaults are conservative; use CalibrateSolenoid in newbrailecombine1.py
+# with the measured SolenoidPhysics of the machine to find shorter ones.
+DEFAULT_PULSE_ON = 0.05 # s
+DEFAULT_CLEARANCE = 0.02 # s
+DEFAULT_SETTLE = 0.05 # s
+DEFAULT_MIN_REFIRE = 0.15 # s
+
+
+class SolenoidModel:
+    def __init__(self, pulse_on=DEFAULT_PULSE_ON, clearance=DEFAULT_CLEARANCE, settle=DEFAULT_SETTLE,
+                 min_refire=DEFAULT_MIN_REFIRE, active=LOW):
+        self.pulse_on = pulse_on
+        self.clearance = min(clearance, settle)
+        self.settle = settle
+        self.min_refire = min_refire
+        self.active = active
+        self.reset()
+
+    def reset(self):
+        # Deadlines are on the backend clock, forget them with a new backend
+        self.last_fire = None
+        self.retracted_at = None
+
+    def copy(self):
+        # Same timings, own deadlines (dry runs, see jobestimate.py)
+        return SolenoidModel(self.pulse_on, self.clearance, self.settle, self.min_refire, self.active)
+
+    def level(self, down):
+        return self.active if down else HIGH - self.active
+
+    def dwell(self, down):
+        # Wait after a plain down or up command
+        return self.pulse_on if down else self.clearance
+
+    def wait_until(self, backend, deadline):
+        wait = deadline - backend.now()
+        if wait > 0:
+            backend.sleep(wait)
+
+    def fire(self, backend):
+        # Waits for the retract and min_refire of the previous strike, then
+        # marks this one as fired now
+        if self.retracted_at is not None:
+            self.wait_until(backend, self.retracted_at)
+        if self.last_fire is not None:
+            self.wait_until(backend, self.last_fire + self.min_refire)
+        self.last_fire = backend.now()
+
+    def release(self, backend):
+        # Marks the pin released now, returns when the head may move
+        released = backend.now()
+        self.retracted_at = released + self.settle
+        return released + self.clearance
+
+    def strike_time(self):
+        # Time per dot spent on the solenoid when dots are next to each other
+        # (the retract overlaps travel) and when struck in place
+        return self.pulse_on + self.clearance, max(self.pulse_on + self.settle, self.min_refire)
+
+    def __repr__(self):
+        return (f"SolenoidModel(pulse_on={self.pulse_on:.3f}, clearance={self.clearance:.3f}, "
+                f"settle={self.settle:.3f}, min_refire={self.min_refire:.3f})")
+
+
+# Simulated mechanics for calibration. Times vary per strike by +-jitter.
+#   stroke    energised time the pin needs to emboss a full dot
+#   clear     time for the pin to leave the paper after the coil drops
+#   release   time until it is fully back and can be fired again
+#   recovery  shortest fire-to-fire interval the coil and spring manage
+DEFAULT_STROKE = 0.025 # s
+DEFAULT_CLEAR = 0.01 # s
+DEFAULT_RELEASE = 0.03 # s
+DEFAULT_RECOVERY = 0.07 # s
+DEFAULT_JITTER = 0.1
+
+
+class SolenoidPhysics:
+    def __init__(self, stroke=DEFAULT_STROKE, clear=DEFAULT_CLEAR, release=DEFAULT_RELEASE,
+                 recovery=DEFAULT_RECOVERY, jitter=DEFAULT_JITTER, seed=0):
+        self.stroke = stroke
+        self.clear = clear
+        self.release = release
+        self.recovery = recovery
+        self.jitter = jitter
+        self.seed = seed
+
+    def evaluate(self, edges, solenoid_pin, step_pins, active=LOW):
+        # Checks every strike in a simulator edge log (SimulatedGPIOBackend
+        # with record_edges). Returns counts of dots and of the ways they fail:
+        #   weak     released before the stroke finished
+        #   smeared  a step before the pin had left the paper
+        #   early    fired again before release or recovery were over
+        rng = random.Random(self.seed)
+        strikes = []
+        steps = []
+        fired = None
+        for at, pin, level in edges:
+            if pin == solenoid_pin:
+                if level == active and fired is None:
+                    fired = at
+                elif level != active and fired is not None:
+                    strikes.append((fired, at))
+                    fired = None
+            elif pin in step_pins and level == HIGH:
+                steps.append(at)
+        result = {"dots": len(strikes), "weak": 0, "smeared": 0, "early": 0}
+        step_index = 0
+        retracted_at = None
+        previous_fire = None
+        for fired, released in strikes:
+            scale = 1 + rng.uniform(-self.jitter, self.jitter)
+            if released - fired < self.stroke * scale:
+                result["weak"] += 1
+            if previous_fire is not None and (fired < retracted_at or fired - previous_fire < self.recovery):
+                result["early"] += 1
+            retracted_at = released + self.release * scale
+            while step_index < len(steps) and steps[step_index] <= fired:
+                step_index += 1
+            if step_index < len(steps) and steps[step_index] < released + self.clear * scale:
+                result["smeared"] += 1
+            previous_fire = fired
+        result["reliable"] = result["dots"] > 0 and not (result["weak"] or result["smeared"] or result["early"])
+        return result
@@ -0,0 +1,70 @@
+from array import array
+
+# A planned move compiled into a compact pulse schedule: direction levels set
+# once up front, then one (pin mask, delay_ns) pair per step pulse. The mask
+# is a GPIO bitmask (1 << pin) of the step pins to pulse together, the delay
+# the time from this pulse to the next. Backends play a schedule back in one
+# go (gpiobackend.py), so nothing is computed between steps.
+PULSE_WIDTH_NS = 2000
+
+
+def pins_in_mask(mask):
+    return [pin for pin in range(mask.bit_length()) if mask >> pin & 1]
+
+
+class PulseSchedule:
+    def __init__(self):
+        self.directions = []
+        self.masks = array('I')
+        self.delays = array('I')
+
+    def append(self, mask, delay_ns):
+        self.masks.append(mask)
+        self.delays.append(max(PULSE_WIDTH_NS, int(delay_ns)))
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __iter__(self):
+        return zip(self.masks, self.delays)
+
+    def duration_ns(self):
+        return sum(self.delays)
+
+    def nbytes(self):
+        return self.masks.itemsize * len(self.masks) + self.delays.itemsize * len(self.delays)
+
+    def to_pulses(self, pulse, pulse_width_ns=PULSE_WIDTH_NS):
+        # pigpio style pulses (gpio_on, gpio_off, delay_us). Microsecond
+        # rounding is carried over so long moves do not drift.
+        width_us = max(1, pulse_width_ns // 1000)
+        carry_ns = 0
+        for mask, delay in zip(self.masks, self.delays):
+            period_ns = delay + carry_ns
+            period_us = period_ns // 1000
+            carry_ns = period_ns - period_us * 1000
+            yield pulse(mask, 0, width_us)
+            yield pulse(0, mask, max(1, period_us - width_us))
+
+
+def compile_move(move, step_a, step_b, dir_a, dir_b):
+    # The busier motor steps on every entry of the velocity profile, the
+    # other one joins the pulse whenever its Bresenham error overflows
+    schedule = PulseSchedule()
+    schedule.directions = [(dir_a, 0 if move.steps_a >= 0 else 1), (dir_b, 0 if move.steps_b >= 0 else 1)]
+    a_steps = abs(move.steps_a)
+    b_steps = abs(move.steps_b)
+    if a_steps >= b_steps:
+        major, minor, major_steps, minor_steps = 1 << step_a, 1 << step_b, a_steps, b_steps
+    else:
+        major, minor, major_steps, minor_steps = 1 << step_b, 1 << step_a, b_steps, a_steps
+
+    error = 0
+    for delay in move.step_delays():
+        mask = major
+        error += minor_steps
+        if error >= major_steps:
+            error -= major_steps
+            mask |= minor
+        schedule.append(mask, delay * 1e9)
+    return schedule
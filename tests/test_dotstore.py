@@ -0,0 +1,31 @@
+from array import array
+
+from dotstore import DotStore
+
+
+def test_positions_are_kept_in_hundredths_of_a_millimetre():
+    dots = DotStore()
+    dots.append(1.234, -5.006)
+    dots.append(180, 0.5)
+    assert list(dots.fixed()) == [(123, -501), (18000, 50)]
+    assert list(dots) == [(1.23, -5.01), (180.0, 0.5)]
+    assert dots.nbytes() == 16
+
+
+def test_take_and_unique():
+    dots = DotStore()
+    for x, y in [(1, 1), (2, 1), (1, 1), (0, 2)]:
+        dots.append(x, y)
+    assert list(dots.take([3, 0])) == [(0, 2), (1, 1)]
+    assert list(dots.unique()) == [(1, 1), (2, 1), (0, 2)]
+    assert [dots[i] for i in dots.sorted_indices("x")] == [(0, 200), (100, 100), (100, 100), (200, 100)]
+
+
+def test_masks_follow_their_positions():
+    store = DotStore(masks=array('I'))
+    store.append_strike(1, 0, 0b01)
+    store.append_strike(0, 0, 0b10)
+    store.append_strike(1, 0, 0b100)
+    assert list(store.take([1, 0]).strikes()) == [(0, 0, 0b10), (1, 0, 0b01)]
+    # Repeats are struck once with every pin of both
+    assert list(store.unique().strikes()) == [(1, 0, 0b101), (0, 0, 0b10)]
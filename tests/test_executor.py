@@ -0,0 +1,190 @@
+import pytest
+
+import newbrailecombine1 as executor
+from motionplanner import MotionPlanner
+from jobformat import Job, gcode_to_job
+from solenoid import SolenoidModel
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    # The executor keeps its planner and position in module globals, each
+    # test gets fresh ones on a fresh simulator
+    monkeypatch.setattr(executor, "motion", MotionPlanner(executor.STEPSPERMM, executor.ACCELERATION,
+                                                          executor.MAX_SPEED, executor.JUNCTION_DEVIATION))
+    monkeypatch.setattr(executor, "actuator", SolenoidModel())
+    monkeypatch.setattr(executor, "HEAD", "single")
+    monkeypatch.setattr(executor, "page_change_handler", None)
+    executor.abort.clear()
+    return executor.SetupPins(executor.SimulatedBackend())
+
+
+def net_steps(backend):
+    # Signed steps per motor from the recorded edges, direction low = forward
+    levels = {executor.DIR_A: 0, executor.DIR_B: 0}
+    steps = {executor.STEP_A: 0, executor.STEP_B: 0}
+    directions = {executor.STEP_A: executor.DIR_A, executor.STEP_B: executor.DIR_B}
+    for _, pin, level in backend.edges():
+        if pin in levels:
+            levels[pin] = level
+        elif pin in steps and level:
+            steps[pin] += -1 if levels[directions[pin]] else 1
+    return steps[executor.STEP_A], steps[executor.STEP_B]
+
+
+@pytest.mark.parametrize("gcode, expected", [
+    ("G1 X10 Y0", (1000, 1000)),
+    ("G1 X0 Y10", (1000, -1000)),
+    ("G1 X10 Y10", (2000, 0)),
+    ("G1 X10 Y10\nG1 X4 Y10", (1400, -600)),
+])
+def test_corexy_step_counts_and_directions(backend, gcode, expected):
+    executor.ProcessGcodeString(gcode)
+    assert net_steps(backend) == expected
+
+
+def test_every_step_is_counted(backend):
+    executor.ProcessGcodeString("G1 X10 Y10\nG1 X4 Y10")
+    assert backend.steps == {executor.STEP_A: 2600, executor.STEP_B: 600}
+
+
+def test_x_is_clamped_to_the_travel(backend):
+    executor.ProcessGcodeString(f"G1 X{executor.X_MAX + 50} Y0")
+    assert net_steps(backend) == (executor.X_MAX * 100, executor.X_MAX * 100)
+
+
+def test_moves_run_on_the_virtual_clock(backend):
+    executor.ProcessGcodeString("G1 X0 Y10")
+    planner = MotionPlanner(executor.STEPSPERMM, executor.ACCELERATION, executor.MAX_SPEED)
+    move, = planner.add(0, 10) + planner.flush()
+    assert backend.clock == pytest.approx(move.duration, rel=1e-3)
+
+
+def test_strike_counts(backend):
+    executor.ProcessGcodeString("G1 X1 Y1\nM3 S2\nG1 X2 Y1\nM3 S2\nM3 S1\nM3 S0\n")
+    assert backend.strikes == 3
+
+
+def test_multi_pin_strike_fires_every_pin_in_the_mask(backend):
+    backend = executor.SetupPins(executor.SimulatedBackend(), head="cell")
+    executor.ProcessGcodeString("M3 S2 P5\n")
+    fired = {pin for _, pin, level in backend.edges()
+             if pin in executor.HEAD_PINS and level == executor.actuator.active}
+    assert fired == {executor.HEAD_PINS[0], executor.HEAD_PINS[2]}
+    assert backend.strikes == 2
+
+
+def test_only_the_fitted_head_is_set_up(backend):
+    assert set(backend.levels) & set(executor.HEAD_PINS) == {executor.SOLENOID_PIN}
+    column = executor.SetupPins(executor.SimulatedBackend(), head="column")
+    assert set(column.levels) & set(executor.HEAD_PINS) == set(executor.HEAD_PINS[:3])
+
+
+def test_strikes_on_pins_the_head_does_not_have_are_refused(backend):
+    with pytest.raises(ValueError):
+        executor.ProcessGcodeString("M3 S2 P2\n")
+    executor.SetupPins(executor.SimulatedBackend(), head="column")
+    with pytest.raises(ValueError):
+        executor.ProcessGcodeString("M3 S2 P8\n")
+
+
+def test_strikes_are_timed_by_the_solenoid_model(backend):
+    executor.ProcessGcodeString("M3 S2\nM3 S2\n")
+    # The second strike waits for min_refire after the first one fired and
+    # returns once its pin has cleared the paper
+    model = executor.actuator
+    assert backend.clock == pytest.approx(model.min_refire + model.pulse_on + model.clearance)
+
+
+def test_g29_repeats_the_strike(backend):
+    # Ten on/off cycles, the relay is active low so every off is a strike
+    executor.ProcessGcodeString("G29\n")
+    assert backend.strikes == 10
+    assert backend.clock == pytest.approx(20 * 0.1)
+
+
+def test_g28_resets_the_position(backend):
+    executor.ProcessGcodeString("G1 X10 Y5\nG28 X\nG28 Y\nG1 X10 Y5\n")
+    # Homing sets 0, 0 where the head stands, so the second move is stepped in full
+    assert net_steps(backend) == (3000, 1000)
+
+
+def test_page_change_waits_for_the_next_sheet(backend, monkeypatch):
+    pages = []
+    monkeypatch.setattr(executor, "WaitForPageChange", lambda: pages.append(backend.clock))
+    executor.ProcessGcodeString("M3 S1\nM3 S0\nM0\nM3 S1\nM3 S0\n")
+    assert len(pages) == 1
+    assert backend.strikes == 2
+
+
+def test_page_change_calls_the_handler(backend, monkeypatch):
+    pages = []
+    monkeypatch.setattr(executor, "page_change_handler", lambda: pages.append(backend.clock))
+    executor.ProcessGcodeString("G1 X1 Y1\nM3 S2\nG1 X0 Y0\nM0\nG1 X1 Y1\nM3 S2\n")
+    assert len(pages) == 1
+    assert backend.strikes == 2
+
+
+def test_backend_is_picked_from_the_environment(monkeypatch):
+    monkeypatch.setenv("ECOBRAILLE_GPIO", "sim")
+    assert isinstance(executor.get_backend(), executor.SimulatedGPIOBackend)
+
+
+def test_wave_playback_matches_the_simulator(backend):
+    gcode = "G1 X10 Y10\nG1 X4 Y10\nG1 X4 Y2\n"
+    executor.ProcessGcodeString(gcode)
+    expected = (dict(backend.steps), net_steps(backend))
+
+    executor.motion.set_position(0, 0)
+    wave = executor.SetupPins(executor.SimulatedWaveBackend())
+    executor.ProcessGcodeString(gcode)
+    simulator = wave.pi.simulator
+    assert (simulator.steps, net_steps(simulator)) == expected
+    # Waves are timed in whole microseconds
+    assert simulator.clock == pytest.approx(backend.clock, abs=1e-3)
+    assert wave.pi.waves_sent > 0
+
+
+def test_job_playback_matches_the_gcode(backend):
+    gcode = executor.BrailleGCodeGenerator().braille_to_gcode("abc")
+    executor.ProcessGcodeString(gcode)
+    expected = (dict(backend.steps), backend.strikes, net_steps(backend))
+    clock = backend.clock
+
+    executor.motion.set_position(0, 0)
+    result = executor.SetupPins(executor.SimulatedBackend())
+    executor.ProcessJob(Job(gcode_to_job(gcode)))
+    assert (result.steps, result.strikes, net_steps(result)) == expected
+    assert result.clock == pytest.approx(clock)
+
+
+def test_pipelined_playback_matches_the_serial_one(backend):
+    gcode = executor.BrailleGCodeGenerator().braille_to_gcode("abc")
+    executor.ProcessGcodeString(gcode)
+    expected = (dict(backend.steps), backend.strikes, net_steps(backend))
+
+    executor.motion.set_position(0, 0)
+    result = executor.SetupPins(executor.SimulatedBackend())
+    actions = executor.ProcessGcodePipelined(gcode)
+    assert (result.steps, result.strikes, net_steps(result)) == expected
+    assert result.clock == pytest.approx(backend.clock)
+    assert actions.puts == actions.gets
+
+
+def test_simulated_time_matches_the_estimate(backend):
+    gcode = executor.BrailleGCodeGenerator().braille_to_gcode("hello world")
+    estimate = executor.EstimateJob(gcode)
+    executor.ProcessGcodeString(gcode)
+    # The estimate times moves from their profile, the simulator step by step
+    assert backend.clock == pytest.approx(estimate.total_seconds, abs=1e-3)
+    assert backend.strikes == estimate.strikes
+
+
+def test_every_opcode_is_estimated_as_it_runs(backend):
+    backend = executor.SetupPins(executor.SimulatedBackend(), head="cell")
+    # G29 leaves the pin down (active low), M3 S1 lifts it
+    gcode = "G1 X10 Y5\nG29\nM3 S1\nG28 X\nG28 Y\nG1 X3\nM3 S2 P5\nM3 S0\nM3 S1\nM84\n"
+    estimate = executor.EstimateJob(gcode)
+    executor.ProcessGcodeString(gcode)
+    assert backend.clock == pytest.approx(estimate.total_seconds, abs=1e-3)
+    assert backend.strikes == estimate.dots == 13
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from feedback import Feedback
+
+
+class FakeEngine:
+    # Stands in for pyttsx3: runAndWait blocks until the gate opens, then
+    # "speaks" word by word and stops early when told to
+    def __init__(self):
+        self.gate = threading.Event()
+        self.callbacks = []
+        self.queued = None
+        self.spoken = []
+        self.cut = []
+        self.stopped = False
+
+    def connect(self, name, callback):
+        self.callbacks.append(callback)
+
+    def say(self, text):
+        self.queued = text
+
+    def runAndWait(self):
+        self.gate.wait()
+        self.stopped = False
+        for word in self.queued.split():
+            for callback in self.callbacks:
+                callback("word", 0, len(word))
+            if self.stopped:
+                self.cut.append(self.queued)
+                break
+        self.spoken.append(self.queued)
+
+    def stop(self):
+        self.stopped = True
+
+
+def speaking(feedback, text, timeout=1):
+    # The worker does not signal when it picks a message up, so poll
+    deadline = time.monotonic() + timeout
+    while feedback.speaking != text:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_messages_with_the_same_key_coalesce():
+    engine = FakeEngine()
+    feedback = Feedback(lambda: engine)
+    feedback.say("starting")
+    assert speaking(feedback, "starting")
+    feedback.say("page 1 of 3", key="progress")
+    feedback.say("page 2 of 3", key="progress")
+    feedback.say("paper low")
+    engine.gate.set()
+    assert feedback.wait(1)
+    feedback.close()
+    assert engine.spoken == ["starting", "page 2 of 3", "paper low"]
+    assert (feedback.spoken, feedback.coalesced) == (3, 1)
+
+
+def test_interrupt_drops_the_queue_and_cuts_off_the_message():
+    engine = FakeEngine()
+    feedback = Feedback(lambda: engine)
+    feedback.say("embossing page one of three")
+    assert speaking(feedback, "embossing page one of three")
+    feedback.say("page 2 of 3", key="progress")
+    feedback.say("paper jam", interrupt=True)
+    engine.gate.set()
+    assert feedback.wait(1)
+    feedback.close()
+    assert engine.spoken == ["embossing page one of three", "paper jam"]
+    assert engine.cut == ["embossing page one of three"]
+    assert feedback.coalesced == 1
+
+
+def test_without_an_engine_messages_are_only_logged():
+    def broken():
+        raise RuntimeError("no audio device")
+    feedback = Feedback(broken)
+    feedback.say("hello")
+    feedback.close()
+    assert feedback.spoken == 1
+
+
+def test_close_without_drain_drops_the_queue():
+    engine = FakeEngine()
+    feedback = Feedback(lambda: engine)
+    feedback.say("first")
+    assert speaking(feedback, "first")
+    feedback.say("second")
+    engine.gate.set()
+    feedback.close(drain=False)
+    assert engine.spoken == ["first"]
+
+
+def test_spoke_since_covers_messages_in_progress_and_finished():
+    engine = FakeEngine()
+    feedback = Feedback(lambda: engine)
+    before = time.perf_counter()
+    assert not feedback.spoke_since(before)
+    feedback.say("embossing")
+    assert speaking(feedback, "embossing")
+    assert feedback.spoke_since(time.perf_counter())
+    engine.gate.set()
+    assert feedback.wait(1)
+    assert feedback.spoke_since(before)
+    assert not feedback.spoke_since(time.perf_counter())
+    feedback.close()
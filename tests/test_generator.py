@@ -0,0 +1,81 @@
+import pytest
+
+from newgcodey import BrailleGCodeGenerator
+
+TEXT = "braille embosser\nvoice to paper dots\n" * 3
+
+
+def test_streamed_chunks_match_the_whole_text():
+    generator = BrailleGCodeGenerator()
+    whole = generator.braille_to_gcode(TEXT)
+    chunks = [TEXT[i:i + 7] for i in range(0, len(TEXT), 7)]
+    assert "".join(generator.braille_to_gcode_iter(chunks)) == whole
+
+
+def test_dots_are_handed_over_a_line_at_a_time():
+    generator = BrailleGCodeGenerator()
+    lines = [dots for page, dots in generator.iter_dot_lines([TEXT])]
+    assert len(lines) > 1
+    for dots in lines:
+        assert len({y for x, y in dots}) <= 4
+    generator.braille_to_gcode(TEXT)
+    assert generator.path_planner.dots == sum(len(dots) for dots in lines)
+
+
+def test_every_cell_is_laid_out_once():
+    generator = BrailleGCodeGenerator()
+    dots = [dot for page, line in generator.iter_dot_lines(["hello world"]) for dot in line]
+    assert len(dots) == 31
+    assert len(set(dots)) == len(dots)
+
+
+def test_long_lines_wrap_inside_the_margins():
+    generator = BrailleGCodeGenerator()
+    braille = generator.BRAILLE
+    lines = list(generator.iter_dot_lines(["braille " * 40]))
+    assert len(lines) > 1
+    for page, line in lines:
+        for x, y in line:
+            assert braille["marginWidth"] <= x <= braille["paperWidth"] - braille["marginWidth"]
+            assert y <= braille["paperHeight"] - braille["marginHeight"]
+
+
+def test_long_documents_go_on_to_the_next_page():
+    generator = BrailleGCodeGenerator()
+    pages = generator.paginate(TEXT * 10)
+    assert len(pages) > 1
+    assert [page.index for page in pages] == list(range(len(pages)))
+    assert pages[0].start == 0 and pages[-1].end == len(TEXT * 10)
+    gcode = generator.braille_to_gcode(TEXT * 10)
+    assert gcode.count("M0;") == len(pages) - 1
+
+
+@pytest.mark.parametrize("head", ["single", "column", "cell"])
+def test_page_dots_count_every_pin_fired(head):
+    generator = BrailleGCodeGenerator()
+    generator.BRAILLE["head"] = head
+    page, = generator.paginate("hello world")
+    assert page.dots == 31
+
+
+def test_blank_pages_get_a_page_change_on_every_path():
+    generator = BrailleGCodeGenerator()
+    text = "a" + "\n" * 60 + "b"
+    pages = generator.paginate(text)
+    assert [page.dots for page in pages] == [1, 0, 0, 0, 2]
+    gcode = generator.braille_to_gcode(text)
+    assert gcode.count("M0;") == len(pages) - 1
+    assert "".join(generator.paginated_gcode_iter(text)) == gcode
+    assert generator.generate_pages_parallel(text, workers=2) == gcode
+
+
+def test_pages_built_ahead_match_the_whole_program():
+    generator = BrailleGCodeGenerator()
+    text = TEXT * 10
+    assert "".join(generator.paginated_gcode_iter(text, lookahead=2)) == generator.braille_to_gcode(text)
+
+
+def test_pages_generated_in_parallel_match_the_whole_program():
+    generator = BrailleGCodeGenerator()
+    text = TEXT * 10
+    assert generator.generate_pages_parallel(text, workers=2) == generator.braille_to_gcode(text)
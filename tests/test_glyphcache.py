@@ -0,0 +1,40 @@
+import pytest
+
+from braillegenerator import BrailleGenerator
+from glyphcache import axis_signs, compile_glyph, compile_glyphs, glyph_config_key
+
+DOT_MAP = [[1, 2, 3], [4, 5, 6]]
+
+
+def test_glyph_offsets_follow_the_dot_map():
+    # Dots 1-3 down the first column, 4-6 down the second, row by row
+    assert compile_glyph([1, 4, 5], DOT_MAP, 2, 3, 1, 1) == ((0, 0), (2, 0), (2, 3))
+    assert compile_glyph([1, 2], DOT_MAP, 2, 3, -1, -1) == ((0, 0), (0, -3))
+    assert compile_glyph([], DOT_MAP, 2, 3, 1, 1) == ()
+
+
+def test_every_character_compiles_to_its_dots():
+    generator = BrailleGenerator()
+    glyphs, number_prefix = compile_glyphs(generator.BRAILLE, generator.LANGUAGES)
+    for char, indices in generator.LANGUAGES["6 dots"]["latinToBraille"].items():
+        assert len(glyphs[char]) == len(indices)
+        assert glyphs[char.upper()] == glyphs[char]
+    assert len(number_prefix) == 4
+
+
+def test_signs_and_cache_key():
+    braille = dict(BrailleGenerator().BRAILLE, invertX=True, mirrorX=False, mirrorY=True)
+    assert axis_signs(braille) == (-1, 1)
+    languages = BrailleGenerator().LANGUAGES
+    key = glyph_config_key(braille, languages)
+    assert glyph_config_key(dict(braille, speed=1), languages) == key
+    assert glyph_config_key(dict(braille, letterWidth=3), languages) != key
+
+
+def test_multi_pin_heads_strike_whole_columns_or_cells():
+    # Dots 1, 4, 5: a column head fires row 0 on the first column, rows 0
+    # and 1 on the second; a cell head fires pins 0, 3 and 4 at once
+    assert compile_glyph([1, 4, 5], DOT_MAP, 2, 3, 1, 1, "column") == ((0, 0, 0b1), (2, 0, 0b11))
+    assert compile_glyph([1, 4, 5], DOT_MAP, 2, 3, 1, 1, "cell") == ((0, 0, 0b11001),)
+    with pytest.raises(ValueError):
+        compile_glyph([1], DOT_MAP, 2, 3, 1, 1, "row")
@@ -0,0 +1,36 @@
+import time
+
+import metrics
+from gpiobackend import HIGH, RPiGPIOBackend
+from stepschedule import PulseSchedule
+
+
+class StallingGPIO:
+    # Stands in for RPi.GPIO: records when pulses go high, and the process
+    # "stalls" for a while on one of them
+    def __init__(self, stall_on, stall):
+        self.stall_on = stall_on
+        self.stall = stall
+        self.rises = []
+
+    def output(self, pins, level):
+        if level == HIGH and isinstance(pins, list):
+            self.rises.append(time.perf_counter_ns())
+            if len(self.rises) == self.stall_on:
+                time.sleep(self.stall)
+
+
+def test_pulses_missed_in_a_stall_are_not_fired_back_to_back():
+    backend = RPiGPIOBackend.__new__(RPiGPIOBackend)
+    backend.GPIO = StallingGPIO(stall_on=5, stall=0.01)
+    backend.late_pulses = 0
+    schedule = PulseSchedule()
+    for i in range(12):
+        schedule.append(1 << 21, 1e6)
+    job = metrics.new_job("test")
+    backend.play_schedule(schedule)
+    gaps = [b - a for a, b in zip(backend.GPIO.rises, backend.GPIO.rises[1:])]
+    # Without the catch up the pulses due during the stall follow within microseconds
+    assert min(gaps) > 0.9e6
+    assert backend.late_pulses >= 1
+    assert job.counters["late_pulses"] == backend.late_pulses
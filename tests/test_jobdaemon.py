@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+import newbrailecombine1 as embosser
+from jobdaemon import JobDaemon
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def start(tmp_path):
+    # Daemons embossing on the simulator in the background, stopped after
+    # the test. realtime makes a job take as long as it would on the machine,
+    # long enough to cancel it halfway.
+    started = []
+
+    def start(realtime=False):
+        daemon = JobDaemon(str(tmp_path))
+        thread = threading.Thread(target=daemon.run, args=(embosser.SimulatedBackend(realtime=realtime),))
+        thread.start()
+        started.append((daemon, thread))
+        return daemon
+
+    yield start
+    for daemon, thread in started:
+        daemon.stop()
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+def test_jobs_run_by_priority_then_submission(tmp_path):
+    daemon = JobDaemon(str(tmp_path))
+    first = daemon.submit(text="a")
+    urgent = daemon.submit(text="b", priority=1)
+    last = daemon.submit(gcode="G1 X1 Y1\n")
+    assert [job["id"] for job in daemon.queued()] == [urgent["id"], first["id"], last["id"]]
+    with pytest.raises(ValueError):
+        daemon.submit()
+
+
+def test_cancelled_jobs_leave_the_queue(tmp_path):
+    daemon = JobDaemon(str(tmp_path))
+    job = daemon.submit(text="a")
+    assert daemon.cancel(job["id"])["state"] == "cancelled"
+    assert daemon.queued() == []
+    assert daemon.cancel("nonexistent") is None
+
+
+def test_spool_survives_a_restart(tmp_path):
+    daemon = JobDaemon(str(tmp_path))
+    queued = daemon.submit(text="a")
+    embossing = daemon.submit(text="b")
+    daemon.jobs[embossing["id"]]["state"] = "embossing"
+    daemon.save(daemon.jobs[embossing["id"]])
+
+    restarted = JobDaemon(str(tmp_path))
+    assert [job["id"] for job in restarted.queued()] == [queued["id"]]
+    # Not started again on a half embossed sheet
+    assert restarted.status(embossing["id"])["state"] == "interrupted"
+
+
+def test_queued_jobs_are_translated_and_embossed(start):
+    running = start()
+    first = running.submit(text="ab")
+    second = running.submit(gcode="G1 X1 Y1\nM3 S2\n")
+    wait_for(lambda: running.status(second["id"])["state"] == "done")
+    job = running.status(first["id"])
+    assert job["state"] == "done"
+    assert job["translated"] and job["pages"] == 1 and job["estimate_seconds"] > 0
+    report = running.report()
+    assert (report["done"], report["queue_depth"], report["pages"]) == (2, 0, 2)
+
+
+def test_each_job_counts_only_its_own_work(start):
+    running = start()
+    first = running.submit(text="ab")
+    second = running.submit(text="hello world")
+    wait_for(lambda: running.status(second["id"])["state"] == "done")
+    # Translated ahead while the first one was embossing
+    first, second = running.status(first["id"]), running.status(second["id"])
+    assert (first["counters"]["dots"], first["counters"]["struck"]) == (3, 3)
+    assert (second["counters"]["dots"], second["counters"]["struck"]) == (31, 31)
+    assert first["counters"]["pages"] == second["counters"]["pages"] == 1
+
+
+def test_cancel_stops_the_job_being_embossed(start):
+    running = start(realtime=True)
+    job = running.submit(text="hello world")
+    wait_for(lambda: running.status(job["id"])["state"] == "embossing")
+    running.cancel(job["id"])
+    wait_for(lambda: running.status(job["id"])["finished"] is not None)
+    assert running.status(job["id"])["state"] == "cancelled"
+
+
+def test_page_change_waits_for_a_resume(start):
+    running = start()
+    job = running.submit(text="a" + "\n" * 30 + "b")
+    wait_for(lambda: running.status(job["id"])["state"] == "waiting_for_paper")
+    assert running.status(job["id"])["page"] == 2
+    assert running.report()["waiting_for_paper"]
+    running.resume(job["id"])
+    wait_for(lambda: running.status(job["id"])["state"] == "done")
+    assert running.status(job["id"])["pages"] == 2
+
+
+def test_cancel_while_waiting_for_paper(start):
+    running = start()
+    job = running.submit(text="a" + "\n" * 30 + "b")
+    wait_for(lambda: running.status(job["id"])["state"] == "waiting_for_paper")
+    running.cancel(job["id"])
+    wait_for(lambda: running.status(job["id"])["finished"] is not None)
+    assert running.status(job["id"])["state"] == "cancelled"
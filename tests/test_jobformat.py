@@ -0,0 +1,61 @@
+import pytest
+
+from gcodeparser import iter_lines, parse_line, parse_stream
+from jobformat import HOME, MOTORS_OFF, MOVE, PAUSE, SOLENOID, STRIKE, Job, gcode_to_job, gcode_to_records
+from newgcodey import BrailleGCodeGenerator
+
+
+def test_parse_line():
+    command = parse_line("g1 x1.5 Y-2 f3000 ; comment")
+    assert (command.g, command.x, command.y, command.f) == (1, 1.5, -2.0, 3000.0)
+    command = parse_line("M3  S1 (two spaces)")
+    assert (command.m, command.s) == (3, 1.0)
+    assert parse_line("G28.1").g == 28.1
+    assert parse_line("G28 X").axes == "X"
+    assert parse_line("; only a comment") is None
+    assert parse_line("") is None
+
+
+def test_lines_split_across_chunks():
+    assert list(iter_lines(["G1 X", "1\nG1", " Y2\r\nM84"])) == ["G1 X1", "G1 Y2\r", "M84"]
+    assert [command.m for command in parse_stream(["M3 S", "1\n\nM84"])] == [3, 84]
+
+
+def test_records_hold_steps():
+    assert list(Job(gcode_to_job("G1 X1 Y2\nM3 S1\nM3 S0\nG1 X1.5\nM3 S2\nM0\nG28 X\nM84\n"))) == [
+        (MOVE, 100, 200), (SOLENOID, 1, 0), (SOLENOID, 0, 0), (MOVE, 150, 200), (STRIKE, 0, 0),
+        (PAUSE, 0, 0), (HOME, 1, 0), (MOTORS_OFF, 0, 0)]
+
+
+def test_gcode_round_trip():
+    gcode = BrailleGCodeGenerator().braille_to_gcode("hello world")
+    job = Job(gcode_to_job(gcode))
+    assert list(job) == list(gcode_to_records(gcode, 100))
+    assert list(Job(gcode_to_job(job.to_gcode()))) == list(job)
+
+
+def test_braille_to_job_matches_the_gcode():
+    generator = BrailleGCodeGenerator()
+    gcode = generator.braille_to_gcode("the quick brown fox")
+    assert list(Job(generator.braille_to_job("the quick brown fox"))) == list(gcode_to_records(gcode, 100))
+
+
+def test_bad_jobs_are_rejected():
+    data = gcode_to_job("G1 X1 Y1\nM3 S1\n")
+    with pytest.raises(ValueError):
+        Job(b"XXXX" + data[4:])
+    with pytest.raises(ValueError):
+        Job(data[:-4])
+
+
+@pytest.mark.parametrize("head", ["single", "column", "cell"])
+def test_head_modes_emboss_the_same_dots(head):
+    generator = BrailleGCodeGenerator()
+    generator.BRAILLE["head"] = head
+    records = list(Job(generator.braille_to_job("braille")))
+    dots = sum(bin(mask).count("1") or 1 for opcode, mask, _ in records if opcode == STRIKE)
+    estimate = generator.estimate("braille")
+    assert dots == estimate.dots
+    single = BrailleGCodeGenerator().estimate("braille")
+    assert dots == single.dots
+    assert estimate.strikes <= single.strikes
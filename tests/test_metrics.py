@@ -0,0 +1,57 @@
+import json
+
+import metrics
+import newbrailecombine1 as executor
+from newgcodey import BrailleGCodeGenerator
+
+
+def test_generation_counts_into_the_current_job():
+    job = metrics.new_job("test")
+    generator = BrailleGCodeGenerator()
+    generator.braille_to_gcode("hello world")
+    assert job.counters["dots"] == job.counters["strikes"] == generator.path_planner.dots
+    assert job.counters["pages"] == 1
+    assert {"translation", "path_planning", "serialization"} <= set(job.spans)
+
+
+def test_multi_pin_strikes_count_every_dot():
+    job = metrics.new_job("test")
+    generator = BrailleGCodeGenerator()
+    generator.BRAILLE["head"] = "cell"
+    generator.braille_to_gcode("hello world")
+    assert job.counters["dots"] == 31
+    assert job.counters["strikes"] < job.counters["dots"]
+
+
+def test_estimate_leaves_the_job_and_the_planner_alone():
+    job = metrics.new_job("test")
+    generator = BrailleGCodeGenerator()
+    generator.braille_to_gcode("hello world")
+    counters = dict(job.counters)
+    planner = generator.path_planner
+    assert generator.estimate("hello world").dots == counters["dots"]
+    assert job.counters == counters
+    assert generator.path_planner is planner
+
+
+def test_execution_counts_moves_and_steps():
+    job = metrics.new_job("test")
+    executor.motion.set_position(0, 0)
+    executor.SetupPins(executor.SimulatedBackend())
+    executor.ProcessGcodeString("G1 X10 Y0\nG1 X10 Y10\n")
+    assert job.counters["moves"] == 2
+    assert job.counters["steps"] == 4000
+    assert job.counters["travel_mm"] == 20
+
+
+def test_dumps_as_json_and_prometheus(tmp_path):
+    job = metrics.new_job('say "hi"')
+    with job.span("translation"):
+        job.count("dots", 3)
+    job.dump(str(tmp_path / "job.json"))
+    data = json.loads((tmp_path / "job.json").read_text())
+    assert data["counters"] == {"dots": 3}
+    assert data["spans"]["translation"]["count"] == 1
+    job.dump(str(tmp_path / "job.prom"))
+    text = (tmp_path / "job.prom").read_text()
+    assert 'ecobraille_dots{job="say \\"hi\\""} 3' in text
@@ -0,0 +1,38 @@
+import pytest
+
+from motionplanner import MotionPlanner
+
+
+def plan(points, lookahead=16):
+    planner = MotionPlanner(100, lookahead=lookahead)
+    moves = []
+    for x, y in points:
+        moves += planner.add(x, y)
+    return moves + planner.flush()
+
+
+@pytest.mark.parametrize("lookahead", [1, 4, 16])
+def test_collinear_chain_speeds_are_continuous(lookahead):
+    moves = plan([(i, 0) for i in range(1, 60)], lookahead)
+    assert len(moves) == 59
+    assert moves[0].entry_speed == 0
+    assert moves[-1].exit_speed == 0
+    for move, following in zip(moves, moves[1:]):
+        assert move.exit_speed == pytest.approx(following.entry_speed)
+
+
+def test_speeds_reachable_within_acceleration():
+    moves = plan([(i % 7 * 3, i // 7 * 2) for i in range(1, 80)])
+    for move in moves:
+        reachable = (move.entry_speed ** 2 + 2 * move.acceleration * move.length) ** 0.5
+        assert move.exit_speed <= reachable + 1e-9
+        assert move.entry_speed <= (move.exit_speed ** 2 + 2 * move.acceleration * move.length) ** 0.5 + 1e-9
+        assert move.entry_speed <= move.max_entry_speed + 1e-9
+
+
+def test_corexy_steps():
+    planner = MotionPlanner(100)
+    x_move, = planner.add(1, 0) + planner.flush()
+    y_move, = planner.add(1, 2) + planner.flush()
+    assert (x_move.steps_a, x_move.steps_b) == (100, 100)
+    assert (y_move.steps_a, y_move.steps_b) == (200, -200)
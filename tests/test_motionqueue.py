@@ -0,0 +1,47 @@
+import threading
+import time
+
+from motionqueue import MotionQueue
+
+
+def put_later(actions, item, delay=0.05):
+    thread = threading.Thread(target=lambda: (time.sleep(delay), actions.put(item)))
+    thread.start()
+    return thread
+
+
+def test_waiting_for_the_first_item_is_not_an_underrun():
+    actions = MotionQueue(4)
+    thread = put_later(actions, "first")
+    assert actions.get() == "first"
+    thread.join()
+    assert actions.underruns == 0
+    assert actions.starved == 0.0
+
+
+def test_empty_queue_mid_job_counts_as_underrun():
+    actions = MotionQueue(4)
+    actions.put("first")
+    assert actions.get() == "first"
+    thread = put_later(actions, "second")
+    assert actions.get() == "second"
+    thread.join()
+    assert actions.underruns == 1
+    assert actions.starved > 0
+
+
+def test_items_come_out_in_order_until_closed():
+    actions = MotionQueue(4)
+    for item in range(3):
+        actions.put(item)
+    actions.close()
+    assert list(actions) == [0, 1, 2]
+    assert (actions.underruns, actions.depth_max) == (0, 4)
+
+
+def test_full_queue_blocks_the_planner_until_cancelled():
+    actions = MotionQueue(1)
+    assert actions.put("first")
+    actions.cancel()
+    assert actions.put("second") is False
+    assert actions.full == 1
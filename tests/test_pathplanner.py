@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from dotstore import DotStore
+from pathplanner import MODES, PathPlanner, boustrophedon, travel_distance
+
+
+def store(points):
+    dots = DotStore()
+    for x, y in points:
+        dots.append(x, y)
+    return dots
+
+
+def grid(columns, rows, pitch=2.5, y0=0):
+    return store((x * pitch, y0 + y * pitch) for y in range(rows) for x in range(columns))
+
+
+def test_zigzag_reverses_every_row():
+    dots = grid(3, 2, 1)
+    assert list(dots.take(boustrophedon(dots, (0, 0)))) == [(0, 0), (1, 0), (2, 0), (2, 1), (1, 1), (0, 1)]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_every_dot_is_kept_and_travel_never_grows(mode):
+    rng = random.Random(1)
+    dots = store((round(rng.uniform(0, 170), 2), round(rng.uniform(0, 20), 2)) for _ in range(200))
+    planner = PathPlanner(mode)
+    ordered = planner.plan(dots)
+    assert sorted(ordered.fixed()) == sorted(dots.fixed())
+    assert planner.travel_after <= planner.travel_before
+    assert planner.travel_after == pytest.approx(travel_distance(ordered, None, (0, 0)))
+
+
+def test_repeated_positions_are_struck_once():
+    planner = PathPlanner()
+    assert len(planner.plan(store([(1, 1), (2, 1), (1, 1)]))) == 2
+
+
+def test_head_carries_over_between_lines():
+    planner = PathPlanner()
+    first = planner.plan(grid(4, 1))
+    second = planner.plan(grid(4, 1, y0=10))
+    # The second line starts at the end the first one finished
+    assert second[0][0] == first[len(first) - 1][0]
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        PathPlanner("spiral")
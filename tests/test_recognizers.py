@@ -0,0 +1,50 @@
+import os
+import wave
+
+import pytest
+
+sr = pytest.importorskip("speech_recognition")
+
+import recognizers
+from recognizers import FileRecognizer, SAMPLE_RATE, SAMPLE_WIDTH, transcribe
+
+
+def write_clip(path, seconds, text=None):
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(SAMPLE_WIDTH)
+        file.setframerate(SAMPLE_RATE)
+        # Frames differ per clip, the fake looks transcripts up by audio
+        file.writeframes(bytes([len(path.name)]) * int(seconds * SAMPLE_RATE * SAMPLE_WIDTH))
+    if text is not None:
+        path.with_suffix(".txt").write_text(text + "\n")
+
+
+def test_file_recognizer_plays_clips_in_order(tmp_path):
+    write_clip(tmp_path / "1.wav", 0.5, "hello")
+    write_clip(tmp_path / "2-long.wav", 1.0, "world")
+    write_clip(tmp_path / "3-silence.wav", 0.25)
+    engine = FileRecognizer(str(tmp_path))
+    assert transcribe(engine, engine.listen()).text == "hello"
+    assert transcribe(engine, engine.listen()).text == "world"
+    with pytest.raises(sr.UnknownValueError):
+        engine.recognize(engine.listen())
+    with pytest.raises(EOFError):
+        engine.listen()
+
+
+def test_transcribe_reports_audio_length(tmp_path):
+    write_clip(tmp_path / "clip.wav", 0.5, "braille")
+    engine = FileRecognizer([str(tmp_path / "clip.wav")], real_time_factor=0.1)
+    utterance = transcribe(engine, engine.listen())
+    assert utterance.text == "braille"
+    assert utterance.audio_seconds == pytest.approx(0.5)
+    assert utterance.latency >= 0.05
+
+
+def test_file_recognizer_from_the_environment(tmp_path, monkeypatch):
+    write_clip(tmp_path / "a.wav", 0.1, "a")
+    write_clip(tmp_path / "bb.wav", 0.1, "b")
+    monkeypatch.setenv("ECOBRAILLE_AUDIO", str(tmp_path / "bb.wav") + os.pathsep + str(tmp_path / "a.wav"))
+    engine = recognizers.get_recognizer("file")
+    assert [engine.recognize(engine.listen()) for _ in engine.paths] == ["b", "a"]
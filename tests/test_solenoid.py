@@ -0,0 +1,47 @@
+import pytest
+
+import newbrailecombine1 as executor
+from gpiobackend import HIGH, LOW
+from solenoid import SolenoidModel, SolenoidPhysics
+
+PIN = 16
+STEP = 21
+
+
+def strike(fired, released):
+    return [(fired, PIN, LOW), (released, PIN, HIGH)]
+
+
+def evaluate(edges):
+    return SolenoidPhysics(jitter=0).evaluate(edges, PIN, (STEP,))
+
+
+def test_clean_strikes_are_reliable():
+    result = evaluate(strike(0.0, 0.05) + strike(0.2, 0.25) + [(0.3, STEP, HIGH)])
+    assert result == {"dots": 2, "weak": 0, "smeared": 0, "early": 0, "reliable": True}
+
+
+def test_weak_smeared_and_early_strikes_are_counted():
+    assert evaluate(strike(0.0, 0.01))["weak"] == 1
+    assert evaluate(strike(0.0, 0.05) + [(0.06, STEP, HIGH)])["smeared"] == 1
+    assert evaluate(strike(0.0, 0.05) + strike(0.06, 0.11))["early"] == 1
+    assert not evaluate([])["reliable"]
+
+
+def test_head_may_move_once_the_pin_has_cleared():
+    model = SolenoidModel(pulse_on=0.05, clearance=0.02, settle=0.05, min_refire=0.15)
+    # Next to each other the retract overlaps travel, in place it does not
+    assert model.strike_time() == pytest.approx((0.07, 0.15))
+    assert model.level(True) == LOW and model.level(False) == HIGH
+    assert SolenoidModel(clearance=0.1, settle=0.05).clearance == 0.05
+
+
+def test_calibration_finds_reliable_faster_timings():
+    saved = (executor.actuator, executor.gpio)
+    physics = SolenoidPhysics()
+    model = executor.CalibrateSolenoid(physics, dots=20)
+    assert (executor.actuator, executor.gpio) == saved
+    assert model.pulse_on >= physics.stroke
+    assert model.clearance >= physics.clear
+    assert model.min_refire >= physics.recovery
+    assert all(a < b for a, b in zip(model.strike_time(), SolenoidModel().strike_time()))
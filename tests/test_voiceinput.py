@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("speech_recognition")
+
+from test_recognizers import write_clip
+from recognizers import FileRecognizer
+from VoiceInput import VoiceService
+
+
+class FakeFeedback:
+    # Feedback that is being spoken during the first `busy` recordings
+    def __init__(self, busy):
+        self.busy = busy
+        self.said = []
+
+    def say(self, text, key=None, interrupt=False):
+        self.said.append(text)
+
+    def spoke_since(self, since):
+        self.busy -= 1
+        return self.busy >= 0
+
+    def close(self):
+        pass
+
+
+def test_audio_recorded_over_feedback_is_dropped(tmp_path):
+    write_clip(tmp_path / "1-echo.wav", 0.2, "please say something")
+    write_clip(tmp_path / "2.wav", 0.2, "hello")
+    service = VoiceService(FileRecognizer(str(tmp_path)), FakeFeedback(busy=1))
+    assert [dictated.text for dictated in service.utterances()] == ["hello"]